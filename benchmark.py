@@ -0,0 +1,458 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+'''Performance benchmarks for the Markov Comic Generator. Run "python benchmark.py --help" for the list of benchmarks.'''
+
+import six
+import getopt
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import hashlib
+from six.moves import socketserver, xmlrpc_client, xmlrpc_server
+from timeit import default_timer
+
+from generator import GeneratorSet
+from imagecache import ImageCache
+from imageencoder import ImageEncoder
+from uploader import WordPressUploader
+from uploadledger import UploadLedger
+
+commentMark = "}}"
+
+def writeSyntheticCorpus( outDir, scale, rng ):
+	'''Write a made-up set of transcripts whose size, and vocabulary size, are proportional to scale. Made-up words are used so that the vocabulary keeps growing with the corpus, as it does with real transcripts.
+		Args:
+			outDir: The directory in which to create the 'transcripts' subdirectory.
+			scale: A positive integer. A scale of 1 is roughly the size of the real corpus.
+			rng: A random.Random used to make the words.
+		Returns:
+			The number of words written.
+	'''
+	transcriptDir = os.path.join( outDir, "transcripts" )
+	os.makedirs( transcriptDir )
+	
+	vocabulary = []
+	for i in range( 2000 * scale ):
+		vocabulary.append( "".join( rng.choice( "ABCDEFGHIJKLMNOPQRSTUVWXYZ" ) for j in range( rng.randint( 1, 9 ) ) ) )
+	
+	numWords = 0
+	for comicNumber in range( 500 * scale ):
+		comicID = str( comicNumber + 1 )
+		outFile = open( os.path.join( transcriptDir, comicID + ".txt" ), "wt" )
+		six.print_( comicID, file=outFile )
+		for lineNumber in range( 4 ):
+			words = [ rng.choice( vocabulary ) for i in range( rng.randint( 2, 8 ) ) ]
+			words[ -1 ] += rng.choice( ".?!" )
+			numWords += len( words )
+			six.print_( rng.choice( "EM" ) + ": " + " ".join( words ), file=outFile )
+		outFile.close()
+	return numWords
+
+def benchmarkGraphBuild( scales ):
+	'''Time GeneratorSet.buildGraphs() on synthetic corpora of different sizes. If building scales linearly, the time per word should stay roughly constant as the corpus grows.
+		Args:
+			scales: A list of positive integers, each a corpus size to try (see writeSyntheticCorpus()).
+	'''
+	for scale in scales:
+		tempDir = tempfile.mkdtemp()
+		try:
+			numWords = writeSyntheticCorpus( tempDir, scale, random.Random( scale ) )
+			
+			generatorSet = GeneratorSet( cm = commentMark )
+			startTime = default_timer()
+			generatorSet.buildGraphs( tempDir )
+			buildTime = default_timer() - startTime
+		finally:
+			shutil.rmtree( tempDir )
+		
+		six.print_( "Scale %3d: %8d words, built in %7.3f seconds, %6.2f microseconds/word" % ( scale, numWords, buildTime, buildTime * 1000000 / numWords ) )
+
+def benchmarkOrders( inDir, orders ):
+	'''Build the Markov graphs for the real transcripts at several orders, reporting the size of the graphs and the time and (on Python 3) memory taken to build them.
+		Args:
+			inDir: The input directory, containing the 'transcripts' subdirectory.
+			orders: A list of positive integers, each an order to try.
+	'''
+	try:
+		import tracemalloc
+	except ImportError:
+		tracemalloc = None
+	
+	for order in orders:
+		if tracemalloc is not None:
+			tracemalloc.start()
+		
+		generatorSet = GeneratorSet( cm = commentMark, order = order )
+		startTime = default_timer()
+		generatorSet.buildGraphs( inDir )
+		buildTime = default_timer() - startTime
+		
+		peakMemory = "unknown"
+		if tracemalloc is not None:
+			peakMemory = "%.1f MB" % ( tracemalloc.get_traced_memory()[ 1 ] / 1000000.0 )
+			tracemalloc.stop()
+		
+		numWords = numStates = numEdges = 0
+		for generator in generatorSet.generators.values():
+			numWords += len( generator.model.words )
+			numStates += generator.countStates()
+			numEdges += generator.countEdges()
+		
+		six.print_( "Order %d: %6d words, %6d states, %6d edges, built in %6.3f seconds, peak memory %s" % ( order, numWords, numStates, numEdges, buildTime, peakMemory ) )
+
+def benchmarkImports( modules, runs ):
+	'''Time how long fresh Python processes take to start up and import each of several modules. Where Python supports "-X importtime" (3.7 and up), also list the slowest imports made by the first module.
+		Args:
+			modules: A list of module names, e.g. [ "engine", "gui" ].
+			runs: How many times to start each process. The fastest run is reported, as the others include noise from other processes.
+	'''
+	workingDir = os.path.dirname( os.path.abspath( __file__ ) )
+	devNull = open( os.devnull, "wb" )
+	try:
+		for moduleName in [ None ] + modules:
+			if moduleName is None:
+				command = "pass" #Python's own start-up time, for comparison
+				label = "(nothing)"
+			else:
+				command = "import " + moduleName
+				label = moduleName
+			
+			bestTime = None
+			for run in range( runs ):
+				startTime = default_timer()
+				returnCode = subprocess.call( [ sys.executable, "-c", command ], cwd = workingDir, stdout = devNull, stderr = devNull )
+				runTime = default_timer() - startTime
+				if returnCode != 0:
+					break
+				if bestTime is None or runTime < bestTime:
+					bestTime = runTime
+			
+			if returnCode != 0:
+				six.print_( "%-10s could not be imported (exit status %d)" % ( label, returnCode ) )
+			else:
+				six.print_( "%-10s started in %6.3f seconds (best of %d)" % ( label, bestTime, runs ) )
+	finally:
+		devNull.close()
+	
+	if sys.version_info[ : 2 ] < ( 3, 7 ) or len( modules ) == 0:
+		return
+	
+	process = subprocess.Popen( [ sys.executable, "-X", "importtime", "-c", "import " + modules[ 0 ] ], cwd = workingDir, stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True )
+	errors = process.communicate()[ 1 ]
+	importTimes = []
+	for line in errors.splitlines():
+		#Lines look like "import time:       123 |        456 |   some.module"; the first line is a header
+		fields = line.split( "|" )
+		if len( fields ) == 3 and fields[ 1 ].strip().isdigit():
+			importTimes.append( ( int( fields[ 1 ] ), fields[ 2 ].strip() ) )
+	
+	six.print_( "Slowest imports for", modules[ 0 ], "(cumulative, including the modules each one imports):" )
+	for cumulativeTime, importedName in sorted( importTimes, reverse = True )[ :15 ]:
+		six.print_( "%8.1f ms  %s" % ( cumulativeTime / 1000.0, importedName ) )
+
+def sampleImageFiles( inDir, samples ):
+	'''Pick a sample of the comic images.
+		Args:
+			inDir: The input directory, containing the 'images' subdirectory.
+			samples: How many images to pick. They're spread evenly through the images directory.
+		Returns:
+			A list of paths.
+	'''
+	imageDir = os.path.join( inDir, "images" )
+	fileNames = sorted( os.listdir( imageDir ) )
+	step = max( 1, len( fileNames ) // max( 1, samples ) )
+	return [ os.path.join( imageDir, fileName ) for fileName in fileNames[ ::step ][ :samples ] ]
+
+def benchmarkEncoders( inDir, profiles, samples ):
+	'''Save a sample of the comic images with each encoder profile, reporting the time taken and the size of the files.
+		Args:
+			inDir: The input directory, containing the 'images' subdirectory.
+			profiles: A list of encoder profile names (see ImageEncoder.profileNames).
+			samples: How many images to use. They're spread evenly through the images directory.
+	'''
+	imageDir = os.path.join( inDir, "images" )
+	fileNames = sampleImageFiles( inDir, samples )
+	
+	imageCache = ImageCache() #Used to decode the images the same way the engine does, and to remember their palettes
+	images = []
+	for fileName in fileNames:
+		try:
+			images.append( ( imageCache.getImage( fileName, copy = False ), imageCache.getPalette( fileName ) ) )
+		except IOError as error:
+			six.print_( "Skipping", fileName, ":", error, file=sys.stderr )
+	if len( images ) == 0:
+		six.print_( "No images found in", imageDir, file=sys.stderr )
+		return
+	
+	for profile in profiles:
+		encoder = ImageEncoder( profile )
+		totalBytes = 0
+		startTime = default_timer()
+		for image, palette in images:
+			outFile = six.BytesIO()
+			encoder.encode( image, outFile, palette = palette )
+			totalBytes += len( outFile.getvalue() )
+		encodeTime = default_timer() - startTime
+		
+		six.print_( "%-8s %3d images, encoded in %6.3f seconds (%5.1f ms/image), %9d bytes (%7.1f KB/image)" % ( profile, len( images ), encodeTime, encodeTime * 1000 / len( images ), totalBytes, totalBytes / 1000.0 / len( images ) ) )
+
+class StubBlogHandler( xmlrpc_server.SimpleXMLRPCRequestHandler ):
+	protocol_version = "HTTP/1.1" #Keeps connections alive between requests, like real web servers do
+	rpc_paths = ( "/xmlrpc.php", )
+	
+	def do_POST( self ):
+		'''Handle one XML-RPC request, unless the server has been told to misbehave on this one.
+		'''
+		blog = self.server
+		action = blog.startRequest( self.client_address )
+		if isinstance( action, int ):
+			self.rfile.read( int( self.headers[ "Content-Length" ] ) )
+			self.send_response( action )
+			self.send_header( "Content-Length", "0" )
+			self.end_headers()
+			return
+		
+		xmlrpc_server.SimpleXMLRPCRequestHandler.do_POST( self )
+		if action == "close":
+			self.close_connection = True #Without saying so in the response, as servers do when a kept-alive connection times out
+
+class StubBlogServer( socketserver.ThreadingMixIn, xmlrpc_server.SimpleXMLRPCServer ):
+	daemon_threads = True
+	
+	def __init__( self, latency ):
+		'''A pretend WordPress blog, just enough like a real one to test WordPressUploader against. It runs on a free port on this computer.
+			Args:
+				latency: How many seconds to take over each upload and post, to stand in for a slow network.
+		'''
+		xmlrpc_server.SimpleXMLRPCServer.__init__( self, ( "127.0.0.1", 0 ), StubBlogHandler, logRequests = False, allow_none = True )
+		self.latency = latency
+		self.lock = threading.Lock()
+		self.actions = [] #What to do instead of answering the next few requests normally: an HTTP status code to refuse with, "close" to drop the connection after answering, or None
+		self.connections = set() #The client addresses of every connection made
+		self.requests = 0
+		self.media = [] #The MD5 of every uploaded file
+		self.posts = [] #Every post made
+		
+		self.register_function( self.getUsersBlogs, "wp.getUsersBlogs" )
+		self.register_function( self.uploadFile, "wp.uploadFile" )
+		self.register_function( self.newPost, "wp.newPost" )
+	
+	def getURI( self ):
+		return "http://127.0.0.1:%d/xmlrpc.php" % self.server_address[ 1 ]
+	
+	def startRequest( self, clientAddress ):
+		with self.lock:
+			self.connections.add( clientAddress )
+			self.requests += 1
+			if len( self.actions ) > 0:
+				return self.actions.pop( 0 )
+			return None
+	
+	def getUsersBlogs( self, username, password ):
+		return [ { "blogid": "1", "xmlrpc": self.getURI() } ]
+	
+	def uploadFile( self, blogID, username, password, fileData ):
+		time.sleep( self.latency )
+		with self.lock:
+			self.media.append( hashlib.md5( fileData[ "bits" ].data ).hexdigest() )
+			mediaID = len( self.media )
+		return { "id": str( mediaID ), "url": "http://127.0.0.1/media/%d.png" % mediaID }
+	
+	def newPost( self, blogID, username, password, post ):
+		time.sleep( self.latency )
+		if post[ "post_status" ] == "fault": #Lets the caller choose which posts fail
+			raise xmlrpc_client.Fault( 42, "Stub blog told to fail" )
+		with self.lock:
+			self.posts.append( post )
+			return str( len( self.posts ) )
+
+def benchmarkUploads( inDir, samples, connections, latency ):
+	'''Upload a sample of the comic images to a pretend blog running on this computer, checking that WordPressUploader retries only what it should, reuses its connections, sends images intact, keeps uploadMany()'s results in order, and skips comics its ledger says are already posted. Also compares uploading one at a time with uploading over several connections.
+		Args:
+			inDir: The input directory, containing the 'images' subdirectory.
+			samples: How many comics to upload with uploadMany().
+			connections: How many connections uploadMany() may use at once.
+			latency: How many seconds the pretend blog takes over each upload and post.
+		Returns:
+			True if every check passed, False otherwise.
+	'''
+	fileNames = sampleImageFiles( inDir, min( samples, 5 ) )
+	if len( fileNames ) == 0:
+		six.print_( "No images found in", os.path.join( inDir, "images" ), file=sys.stderr )
+		return False
+	
+	failures = []
+	def check( description, passed ):
+		six.print_( ( "PASS: " if passed else "FAIL: " ) + description )
+		if not passed:
+			failures.append( description )
+	
+	server = StubBlogServer( latency )
+	serverThread = threading.Thread( target = server.serve_forever )
+	serverThread.daemon = True
+	serverThread.start()
+	tempDir = tempfile.mkdtemp()
+	try:
+		uri = server.getURI()
+		
+		server.actions = [ 503, 502 ]
+		uploader = WordPressUploader( uri, "user", "password", maxConnections = connections, retryDelay = 0.01 )
+		check( "wp.getUsersBlogs is retried after 503 and 502 errors", getattr( uploader, "blogID", None ) == "1" and len( server.actions ) == 0 )
+		
+		server.actions = [ 429, 503 ]
+		result = uploader.upload( inputFileName = fileNames[ 0 ], transcript = "Refused", silence = True )
+		check( "wp.uploadFile is retried after 429 and 503 errors", result == 0 and len( server.media ) == 1 and len( server.posts ) == 1 )
+		
+		server.actions = [ 502 ]
+		result = uploader.upload( inputFileName = fileNames[ 0 ], transcript = "Failed", silence = True )
+		check( "wp.uploadFile is not retried after a 502 error", result == 502 and len( server.media ) == 1 )
+		
+		server.actions = [ "close" ] #Answers wp.uploadFile, then drops the connection wp.newPost is about to be sent on
+		result = uploader.upload( inputFileName = fileNames[ 0 ], transcript = "Dropped", silence = True )
+		check( "wp.newPost is retried when the server had closed the kept-alive connection", result == 0 and len( server.media ) == 2 and len( server.posts ) == 2 )
+		
+		expectedMedia = []
+		for fileName in fileNames:
+			imageFile = open( fileName, "rb" )
+			try:
+				expectedMedia.append( hashlib.md5( imageFile.read() ).hexdigest() )
+			finally:
+				imageFile.close()
+			uploader.upload( inputFileName = fileName, transcript = "Streamed", silence = True )
+		bigData = os.urandom( 5 * 1000 * 1000 )
+		expectedMedia.append( hashlib.md5( bigData ).hexdigest() )
+		uploader.upload( inputFileName = "big.png", inputData = six.BytesIO( bigData ), transcript = "Streamed from memory", silence = True )
+		check( "Streamed images arrive intact, from files and from memory", server.media[ -len( expectedMedia ): ] == expectedMedia )
+		
+		jobs = []
+		expectedResults = []
+		for jobNumber in range( samples ):
+			if jobNumber % 5 == 3:
+				postStatus = "fault"
+				expectedResults.append( 42 )
+			else:
+				postStatus = "publish"
+				expectedResults.append( 0 )
+			jobs.append( dict( inputFileName = fileNames[ jobNumber % len( fileNames ) ], transcript = "Comic %d" % jobNumber, postStatus = postStatus, silence = True ) )
+		
+		serialUploader = WordPressUploader( uri, "user", "password", maxConnections = 1, retryDelay = 0.01 )
+		startTime = default_timer()
+		serialResults = serialUploader.uploadMany( jobs )
+		serialTime = default_timer() - startTime
+		
+		connectionsBefore = len( server.connections )
+		requestsBefore = server.requests
+		startTime = default_timer()
+		results = uploader.uploadMany( jobs )
+		concurrentTime = default_timer() - startTime
+		newConnections = len( server.connections ) - connectionsBefore
+		check( "uploadMany() returns results in the same order as its jobs", results == expectedResults and serialResults == expectedResults )
+		check( "uploadMany() reuses connections (%d opened for %d requests, at most %d allowed)" % ( newConnections, server.requests - requestsBefore, connections ), 0 < newConnections <= connections )
+		six.print_( "%d comics uploaded in %6.3f seconds over 1 connection, %6.3f seconds over %d connections" % ( samples, serialTime, concurrentTime, connections ) )
+		
+		ledger = UploadLedger( os.path.join( tempDir, "uploads.sqlite" ) )
+		ledgerUploader = WordPressUploader( uri, "user", "password", retryDelay = 0.01, ledger = ledger )
+		mediaBefore = len( server.media )
+		postsBefore = len( server.posts )
+		ledgerUploader.upload( inputFileName = fileNames[ 0 ], transcript = "Ledger", silence = True )
+		ledgerUploader.upload( inputFileName = fileNames[ 0 ], transcript = "Ledger", silence = True )
+		check( "The ledger skips comics which were already posted", len( server.media ) == mediaBefore + 1 and len( server.posts ) == postsBefore + 1 )
+		
+		ledger.connection.execute( "UPDATE uploads SET postID = NULL" ) #As if the post had failed
+		ledger.connection.commit()
+		ledgerUploader.upload( inputFileName = fileNames[ 0 ], transcript = "Ledger", silence = True )
+		check( "The ledger lets comics whose image was uploaded be posted without uploading the image again", len( server.media ) == mediaBefore + 1 and len( server.posts ) == postsBefore + 2 )
+	finally:
+		server.shutdown()
+		server.server_close()
+		shutil.rmtree( tempDir )
+	
+	return len( failures ) == 0
+
+def usage():
+	'''Print command line usage info.
+	'''
+	six.print_( "Usage: python benchmark.py [options] benchmark..." )
+	six.print_( "Benchmarks:" )
+	six.print_( "🞍 encode: Save a sample of the comic images with each encoder profile and compare encoding times and file sizes." )
+	six.print_( "🞍 imports: Time how long it takes to start up and import the headless engine and the GUI, and list the engine's slowest imports." )
+	six.print_( "🞍 graph: Build Markov graphs from synthetic corpora of increasing size, to check that graph building scales linearly." )
+	six.print_( "🞍 upload: Upload a sample of the comic images to a pretend blog on this computer, checking the uploader's retries, connection reuse, streaming, ordering and ledger, and comparing upload times with one and several connections. Exits with status 1 if any check fails." )
+	six.print_( "🞍 orders: Build Markov graphs of several orders from the real transcripts and compare their sizes and build times." )
+	six.print_( "Options:" )
+	six.print_( "🞍 --connections: How many connections the upload benchmark uploads over at once. Defaults to 4" )
+	six.print_( "🞍 -h or --help: Display this usage info." )
+	six.print_( "🞍 -i or --indir: The input directory for benchmarks that use real data. Defaults to ./data/" )
+	six.print_( "🞍 --latency: How many seconds the upload benchmark's pretend blog takes over each upload and post. Defaults to 0.1" )
+	six.print_( "🞍 --modules: A comma-separated list of modules for the imports benchmark. Defaults to engine,gui" )
+	six.print_( "🞍 --profiles: A comma-separated list of encoder profiles for the encode benchmark. Defaults to " + ",".join( ImageEncoder.profileNames ) )
+	six.print_( "🞍 --orders: A comma-separated list of Markov graph orders for the orders benchmark. Defaults to 1,2,3" )
+	six.print_( "🞍 --runs: How many times to repeat each measurement in the imports benchmark. Defaults to 5" )
+	six.print_( "🞍 --samples: How many comic images the encode benchmark uses, and how many comics the upload benchmark uploads. Defaults to 20" )
+	six.print_( "🞍 --scales: A comma-separated list of corpus sizes for the graph benchmark, 1 being about the size of the real corpus. Defaults to 1,10" )
+
+if __name__ == "__main__":
+	try:
+		options, benchmarks = getopt.getopt( sys.argv[ 1: ], "hi:", [ "help", "indir=", "connections=", "latency=", "modules=", "orders=", "profiles=", "runs=", "samples=", "scales=" ] )
+	except getopt.GetoptError as error:
+		six.print_( error )
+		usage()
+		sys.exit( 64 )
+	
+	inDir = "./data/"
+	orders = [ 1, 2, 3 ]
+	scales = [ 1, 10 ]
+	modules = [ "engine", "gui" ]
+	runs = 5
+	profiles = list( ImageEncoder.profileNames )
+	samples = 20
+	connections = 4
+	latency = 0.1
+	for option in options:
+		if option[ 0 ] == "-h" or option[ 0 ] == "--help":
+			usage()
+			sys.exit( 0 )
+		elif option[ 0 ] == "-i" or option[ 0 ] == "--indir":
+			inDir = option[ 1 ]
+		elif option[ 0 ] == "--connections":
+			connections = int( option[ 1 ] )
+		elif option[ 0 ] == "--latency":
+			latency = float( option[ 1 ] )
+		elif option[ 0 ] == "--modules":
+			modules = option[ 1 ].split( "," )
+		elif option[ 0 ] == "--runs":
+			runs = int( option[ 1 ] )
+		elif option[ 0 ] == "--orders":
+			orders = [ int( order ) for order in option[ 1 ].split( "," ) ]
+		elif option[ 0 ] == "--profiles":
+			profiles = option[ 1 ].split( "," )
+		elif option[ 0 ] == "--samples":
+			samples = int( option[ 1 ] )
+		elif option[ 0 ] == "--scales":
+			scales = [ int( scale ) for scale in option[ 1 ].split( "," ) ]
+	
+	if len( benchmarks ) == 0:
+		usage()
+		sys.exit( 64 )
+	
+	for benchmark in benchmarks:
+		if benchmark == "graph":
+			benchmarkGraphBuild( scales )
+		elif benchmark == "orders":
+			benchmarkOrders( inDir, orders )
+		elif benchmark == "encode":
+			benchmarkEncoders( inDir, profiles, samples )
+		elif benchmark == "upload":
+			if not benchmarkUploads( inDir, samples, connections, latency ):
+				sys.exit( 1 )
+		elif benchmark == "imports":
+			benchmarkImports( modules, runs )
+		else:
+			six.print_( "Unknown benchmark:", benchmark, file=sys.stderr )
+			sys.exit( 64 )
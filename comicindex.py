@@ -0,0 +1,352 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import six
+import json
+import os
+import sys
+from timeit import default_timer
+
+from PIL import ImageStat
+
+from idchecker import idChecker
+
+
+class WordBubbleEntry:
+	__slots__ = [ "comicID", "speakers", "bubbles", "backgrounds", "backgroundStamp" ]
+	
+	def __init__( self, comicID, speakers, bubbles, backgrounds = None, backgroundStamp = None ):
+		'''The contents of one word bubble file.
+			Args:
+				comicID: The comic's ID, as a string.
+				speakers: A list of the (upper-cased) labels of the characters who speak in the comic.
+				bubbles: A list of ( character label, box ) tuples, one per line of the file, in order. Each box is a tuple of four integers: ( top left X, top left Y, bottom right X, bottom right Y ).
+				backgrounds: A list of the mean color of the comic's image within each box, in the same order as bubbles, or None if they haven't been computed. See WordBubbleIndex.getBackgrounds().
+				backgroundStamp: The size and modification time of the image file when backgrounds were computed.
+		'''
+		self.comicID = comicID
+		self.speakers = speakers
+		self.bubbles = bubbles
+		self.backgrounds = backgrounds
+		self.backgroundStamp = backgroundStamp
+
+class WordBubbleIndex:
+	formatVersion = 2 #Increase this whenever the format of the cache file changes, so that old cache files get ignored.
+	
+	def __init__( self, wordBubblesDir, cacheDir, cm = "//" ):
+		'''All the word bubble files, read and checked once, so that comics can be chosen from memory instead of from the directory.
+			The parsed files are cached on disk along with each file's size and modification time, so later runs only re-read files that have changed.
+			Args:
+				wordBubblesDir: The directory containing the word bubble (.tsv) files.
+				cacheDir: The directory in which to keep the cache file.
+				cm: A string used to mark the beginning of comments. Defaults to "//".
+		'''
+		self.wordBubblesDir = wordBubblesDir
+		self.cacheDir = cacheDir
+		self.commentMark = cm
+		self.entries = dict() #Maps comic IDs to WordBubbleEntries
+		self.errors = dict() #Maps the comic IDs of invalid files to what's wrong with them
+		self.comicIDs = [] #The IDs of all valid files, sorted, so that the same random choices always choose the same comics
+		self.files = dict() #What gets cached about each file. See load().
+		self.changed = False #Whether anything has changed since the cache file was written
+		self.newBackgrounds = [] #Backgrounds computed since takeNewBackgrounds() was last called. See setBackgrounds().
+		self.numFilesRead = 0
+		self.numFilesCached = 0
+		self.loadTime = 0.0
+	
+	def getFileName( self, comicID ):
+		'''Get the name of a comic's word bubble file.
+			Args:
+				comicID: The comic's ID, as a string.
+			Returns:
+				A string representing a path.
+		'''
+		return os.path.join( self.wordBubblesDir, comicID + ".tsv" )
+	
+	def getCacheFileName( self ):
+		'''Get the name of the file in which the index is cached.
+			Returns:
+				A string representing a path.
+		'''
+		return os.path.join( self.cacheDir, "wordbubbles.json" )
+	
+	def readFile( self, fileName ):
+		'''Read and check one word bubble file.
+			Args:
+				fileName: The path to the file.
+			Returns:
+				A WordBubbleEntry.
+			Raises:
+				ValueError if the file is not in the correct format.
+				IOError or OSError if the file can't be read.
+		'''
+		comicID = os.path.splitext( os.path.basename( fileName ) )[ 0 ]
+		
+		wordBubbleFile = open( fileName, mode="rt" )
+		try:
+			if not idChecker().checkFile( wordBubbleFile, fileName, self.commentMark ):
+				raise ValueError( "is not in the correct format." )
+			
+			speakers = []
+			for line in wordBubbleFile:
+				line = line.partition( self.commentMark )[ 0 ].strip()
+				if len( line ) > 0:
+					speakers = line.upper().split( "\t" )
+					break
+			
+			if len( speakers ) == 0:
+				raise ValueError( "contains no speakers." )
+			
+			bubbles = []
+			for line in wordBubbleFile:
+				line = line.partition( self.commentMark )[ 0 ].strip()
+				if len( line ) > 0:
+					line = line.split( "\t" )
+					character = line[ 0 ].rstrip( ":" ).strip().upper()
+					if character not in speakers:
+						raise ValueError( "does not list " + character + " in its list of speakers." )
+					
+					try:
+						box = ( int( line[ 1 ] ), int( line[ 2 ] ), int( line[ 3 ] ), int( line[ 4 ] ) )
+					except ( IndexError, ValueError ):
+						raise ValueError( "has a bad box for " + character + "." )
+					bubbles.append( ( character, box ) )
+		finally:
+			wordBubbleFile.close()
+		
+		return WordBubbleEntry( comicID, speakers, bubbles )
+	
+	def loadCache( self ):
+		'''Read the cache file.
+			Returns:
+				A dictionary mapping file names to what was cached about them, or an empty dictionary if there is no usable cache file.
+		'''
+		try:
+			cacheFile = open( self.getCacheFileName(), "rt" )
+			try:
+				cached = json.load( cacheFile )
+			finally:
+				cacheFile.close()
+			
+			if cached[ "formatVersion" ] != self.formatVersion or cached[ "commentMark" ] != self.commentMark or cached[ "wordBubblesDir" ] != os.path.abspath( self.wordBubblesDir ):
+				return dict()
+			return cached[ "files" ]
+		except ( IOError, OSError, ValueError, KeyError, TypeError ):
+			return dict()
+	
+	def saveCache( self, files ):
+		'''Write the cache file.
+			Args:
+				files: A dictionary mapping file names to what should be cached about them. See load().
+			Returns:
+				True if the cache was written, False otherwise.
+		'''
+		fileName = self.getCacheFileName()
+		tempFileName = fileName + ".tmp" + str( os.getpid() )
+		try:
+			if not os.path.isdir( self.cacheDir ):
+				os.makedirs( self.cacheDir )
+			
+			cacheFile = open( tempFileName, "wt" )
+			try:
+				json.dump( { "formatVersion": self.formatVersion, "commentMark": self.commentMark, "wordBubblesDir": os.path.abspath( self.wordBubblesDir ), "files": files }, cacheFile )
+			finally:
+				cacheFile.close()
+			os.rename( tempFileName, fileName )
+		except ( IOError, OSError ) as error:
+			six.print_( "Warning: Could not save the word bubble index to", self.cacheDir, ":", error, file=sys.stderr )
+			return False
+		return True
+	
+	def load( self, silence = False ):
+		'''Index every word bubble file, reading only those that aren't cached or have changed since they were cached.
+			Args:
+				silence: Whether to keep quiet about invalid files. Defaults to False.
+		'''
+		startTime = default_timer()
+		
+		cached = self.loadCache()
+		files = dict()
+		self.entries = dict()
+		self.errors = dict()
+		self.numFilesRead = 0
+		self.numFilesCached = 0
+		
+		for fileName in sorted( os.listdir( self.wordBubblesDir ) ):
+			if not fileName.endswith( ".tsv" ):
+				continue
+			
+			path = os.path.join( self.wordBubblesDir, fileName )
+			fileStat = os.stat( path )
+			cachedFile = cached.get( fileName )
+			if cachedFile is not None and cachedFile[ "size" ] == fileStat.st_size and cachedFile[ "mtime" ] == fileStat.st_mtime:
+				self.numFilesCached += 1
+			else:
+				self.numFilesRead += 1
+				cachedFile = { "size": fileStat.st_size, "mtime": fileStat.st_mtime }
+				try:
+					entry = self.readFile( path )
+					cachedFile[ "speakers" ] = entry.speakers
+					cachedFile[ "bubbles" ] = [ [ character, list( box ) ] for character, box in entry.bubbles ]
+				except ( ValueError, IOError, OSError ) as error:
+					cachedFile[ "error" ] = str( error )
+					if not silence:
+						six.print_( "Warning: Word bubble file", path, error, file=sys.stderr )
+			files[ fileName ] = cachedFile
+			
+			comicID = os.path.splitext( fileName )[ 0 ]
+			if "error" in cachedFile:
+				self.errors[ comicID ] = cachedFile[ "error" ]
+			else:
+				backgroundStamp = cachedFile.get( "backgroundStamp" )
+				if backgroundStamp is not None:
+					backgroundStamp = tuple( backgroundStamp )
+				self.entries[ comicID ] = WordBubbleEntry( comicID, cachedFile[ "speakers" ], [ ( character, tuple( box ) ) for character, box in cachedFile[ "bubbles" ] ], cachedFile.get( "backgrounds" ), backgroundStamp )
+		
+		self.comicIDs = sorted( self.entries.keys() )
+		self.files = files
+		
+		self.changed = self.numFilesRead > 0 or len( files ) != len( cached )
+		self.saveIfChanged()
+		
+		self.loadTime = default_timer() - startTime
+	
+	def saveIfChanged( self ):
+		'''Write the cache file if anything has been added to the index since it was last written.
+		'''
+		if self.changed:
+			self.saveCache( self.files )
+			self.changed = False
+	
+	def getBackgrounds( self, comicID, imageFileName, image ):
+		'''Get the mean color of a comic's image within each of its word bubble boxes, which is used to choose a text color that will be visible. These are computed the first time they are needed for each image, then cached along with the rest of the index until the image file changes.
+			Args:
+				comicID: The comic's ID, as a string. Must be in the index.
+				imageFileName: The path to the comic's image file.
+				image: The comic's image, as a PIL Image, before anything has been drawn on it.
+			Returns:
+				A list of means (each a list with one number per band of the image), one per bubble.
+		'''
+		entry = self.entries[ comicID ]
+		try:
+			fileStat = os.stat( imageFileName )
+			backgroundStamp = ( fileStat.st_size, fileStat.st_mtime, image.mode )
+		except OSError:
+			backgroundStamp = None
+		
+		if backgroundStamp is None or entry.backgrounds is None or entry.backgroundStamp != backgroundStamp:
+			self.setBackgrounds( comicID, [ ImageStat.Stat( image.crop( box ) ).mean for character, box in entry.bubbles ], backgroundStamp )
+		
+		return entry.backgrounds
+	
+	def setBackgrounds( self, comicID, backgrounds, backgroundStamp ):
+		'''Record the mean colors within a comic's word bubble boxes, as computed by getBackgrounds() in this process or in a worker process.
+			Args:
+				comicID: The comic's ID, as a string. Must be in the index.
+				backgrounds: A list as returned by getBackgrounds().
+				backgroundStamp: A tuple identifying the image file the backgrounds were computed from: ( size, modification time, image mode ). None if the file couldn't be examined, in which case the backgrounds aren't cached on disk.
+		'''
+		entry = self.entries[ comicID ]
+		entry.backgrounds = backgrounds
+		entry.backgroundStamp = backgroundStamp
+		if backgroundStamp is not None:
+			cachedFile = self.files[ comicID + ".tsv" ]
+			cachedFile[ "backgrounds" ] = backgrounds
+			cachedFile[ "backgroundStamp" ] = list( backgroundStamp )
+			self.changed = True
+			self.newBackgrounds.append( ( comicID, backgrounds, backgroundStamp ) )
+	
+	def takeNewBackgrounds( self ):
+		'''Get the backgrounds computed since this was last called. Worker processes send these to the main process, whose index is the one that gets saved.
+			Returns:
+				A list of tuples: ( comic ID, backgrounds, background stamp ), each to be passed to setBackgrounds().
+		'''
+		newBackgrounds = self.newBackgrounds
+		self.newBackgrounds = []
+		return newBackgrounds
+	
+	def getEntry( self, comicID ):
+		'''Get the contents of a comic's word bubble file.
+			Args:
+				comicID: The comic's ID, as a string.
+			Returns:
+				A WordBubbleEntry, or None if the file doesn't exist or is invalid (see getError()).
+		'''
+		return self.entries.get( comicID )
+	
+	def getError( self, comicID ):
+		'''Find out what's wrong with a comic's word bubble file.
+			Args:
+				comicID: The comic's ID, as a string.
+			Returns:
+				A string describing the problem, or None if the file is valid or doesn't exist.
+		'''
+		return self.errors.get( comicID )
+	
+	def chooseComicID( self, rng ):
+		'''Randomly choose a comic from those with valid word bubble files.
+			Args:
+				rng: The random.Random to make the choice with.
+			Returns:
+				A comic ID, or None if there are no valid word bubble files.
+		'''
+		if len( self.comicIDs ) == 0:
+			return None
+		return rng.choice( self.comicIDs )
+	
+	def showStats( self ):
+		'''Shows a few stats on standard output. Shouldn't be called before load().
+		'''
+		six.print_( "Indexed " + str( len( self.entries ) + len( self.errors ) ) + " word bubble files (" + str( self.numFilesRead ) + " read, " + str( self.numFilesCached ) + " cached, " + str( len( self.errors ) ) + " invalid) in " + "%.3f" % self.loadTime + " seconds." )
+
+class SourceIndex:
+	def __init__( self, fileName, cm = "//" ):
+		'''The contents of sources.tsv, which says where the original of each comic can be found. The file is read once, and again only if it changes.
+			Args:
+				fileName: The path to sources.tsv. The file is optional; if it doesn't exist, no comic has a source.
+				cm: A string used to mark the beginning of comments. Defaults to "//".
+		'''
+		self.fileName = fileName
+		self.commentMark = cm
+		self.sources = dict() #Maps comic IDs to URLs (or whatever else the file says)
+		self.fileStamp = None #The size and modification time of the file when it was read, or None if it hasn't been read
+		self.numLoads = 0
+	
+	def refresh( self ):
+		'''Read the file if it has changed (or appeared, or disappeared) since it was last read.
+		'''
+		try:
+			fileStat = os.stat( self.fileName )
+			fileStamp = ( fileStat.st_size, fileStat.st_mtime )
+		except OSError:
+			fileStamp = ( None, None )
+		
+		if fileStamp == self.fileStamp:
+			return
+		
+		sources = dict()
+		if fileStamp != ( None, None ):
+			sourceFile = open( self.fileName, "rt" )
+			try:
+				for line in sourceFile:
+					line = line.partition( self.commentMark )[ 0 ].strip()
+					if len( line ) > 0:
+						line = line.split( "\t" )
+						if len( line ) > 1 and line[ 0 ] not in sources: #If an ID is listed more than once, the first one counts
+							sources[ line[ 0 ] ] = line[ 1 ]
+			finally:
+				sourceFile.close()
+		
+		self.sources = sources
+		self.fileStamp = fileStamp
+		self.numLoads += 1
+	
+	def getSource( self, comicID ):
+		'''Find where the original of a comic can be found.
+			Args:
+				comicID: The comic's ID, as a string.
+			Returns:
+				A string, preferably a URL, or None if the comic isn't listed.
+		'''
+		self.refresh()
+		return self.sources.get( comicID )
@@ -0,0 +1,1090 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+'''The comic generator itself: reading the inputs, generating dialog, laying it out, and saving and uploading the results. Nothing in here depends on Kivy or pygame, so command line runs don't have to import them; the GUI is in gui.py.'''
+
+import six
+import getopt
+import hashlib
+import os
+import random
+import sys
+
+from PIL import Image, ImageDraw, ImageStat
+from PIL.PngImagePlugin import PngInfo
+
+from comicindex import SourceIndex, WordBubbleIndex
+from fontfinder import FontFinder
+from generator import GeneratorSet
+from graphcache import GraphCache
+from imagecache import ImageCache
+from imageencoder import ImageEncoder
+from idchecker import idChecker
+from fontcache import FontCache, TextSizeCache
+from markovnode import MarkovNode
+from pipeline import PipelineStage
+import string
+
+idChecker = idChecker()
+
+#Exit statuses
+#These are copied from my /usr/include/sysexits.h. Only statuses possibly relevant to this program were copied.
+EX_OK = 0 #No problems
+EX_USAGE = 64 #Command line error
+EX_DATAERR = 65 #Data format error
+EX_NOINPUT = 66 #Input not openable
+EX_CANTCREAT = 73 #Can't create output file
+EX_NOPERM = 77 #Permission error
+
+class ComicEngine( object ):
+	def __init__( self ):
+		'''Set every option to its default. Call parseOptions() to change them from the command line.
+		'''
+		self.silence = self.silenceDefault = False
+		
+		if not self.silence:
+			six.print_( "Copyright 2015 James Dearing. Licensed under the GNU Affero General Public License (AGPL), either version 3.0 or (at your option) any later version published by the Free Software Foundation. You should have received a copy of the AGPL with this program. If you did not, you can find version 3 at https://www.gnu.org/licenses/agpl-3.0.html or the latest version at https://www.gnu.org/licenses/agpl.html" )
+		
+		
+		self.inDir = self.inDirDefault = "./data/"
+		self.outTextFileName = self.outTextFileNameDefault = "default out.txt"
+		self.outImageFileName = self.outImageFileNameDefault = "default out.png"
+		self.numberOfComics = self.numberOfComicsDefault = 1
+		self.saveForWeb = self.saveForWebDefault = False
+		self.encoderProfile = self.encoderProfileDefault = "lossless"
+		self.commentMark = self.commentMarkDefault = "}}" #If in the future we decide to use a different mark for comments, this is the only line we'll need to change.
+		self.commandLineFont = None #If a font file is specified on the command line, this will be set.
+		self.topImageFileName = None
+		self.randomizeCapitals = self.randomizeCapitalsDefault = False
+		self.WordPressURI = self.WordPressURIDefault = None
+		self.loginName = self.loginNameDefault = None
+		self.loginPassword = self.loginPasswordDefault = None
+		self.shortName = self.shortNameDefault = None
+		self.longName = None #longName's default is not specified here
+		self.commandLineComicID = None
+		self.noGUI = self.noGUIDefault = False
+		self.rebuildCache = self.rebuildCacheDefault = False
+		self.order = self.orderDefault = 1
+		self.numberOfJobs = self.numberOfJobsDefault = 1
+		self.queueSize = self.queueSizeDefault = 2
+		self.uploadConnections = self.uploadConnectionsDefault = 1
+		self.noLocalOutput = self.noLocalOutputDefault = False
+		self.uploadLedgerFileName = None #If no ledger file is specified on the command line, parseOptions() puts one in the cache directory
+		self.imageCacheSize = self.imageCacheSizeDefault = 256 #In megabytes
+		self.fontCacheSize = self.fontCacheSizeDefault = 1024 #In fonts
+		self.seed = None #If no seed is specified on the command line, parseOptions() picks one at random
+		self.numberOfComicsGenerated = 0 #Comics are seeded by their position in the whole session, so each press of the GUI's generate button gets a new comic
+		
+		self.wordBubblesDir = os.path.join( self.inDir, "word-bubbles" )
+		self.fontsDir = os.path.join( self.inDir, "fonts" )
+		self.imageDir = os.path.join( self.inDir, "images" )
+		self.cacheDir = self.getCacheDir()
+		
+		self.fontFiles = None #Found by getFontFiles() when first needed, since finding system fonts is slow
+		
+		self.blogUploaders = [] #Filled in by parseOptions()
+		
+		self.generators = dict() #A dictionary of Markov chain generators, one per character. Moved this line out of the for loop so we don't have to waste time regenerating Markov graphs when two or more comics have the same characters in them. Search for "for speaker in speakers:\nif speaker not in generators:" - this was originally just above that.
+		self.generatorSet = None #All the generators get built at once, the first time any of them is needed, so that the transcripts are only read once.
+		self.wordBubbleIndex = None #Loaded by prepareWordBubbleIndex() when first needed
+		self.sourceIndex = None #Created by getSourceIndex() when first needed
+		self.textSizeCache = TextSizeCache()
+		self.fontCache = None #Created by parseOptions(), since its size is an option
+		self.imageCache = None #Created by parseOptions(), since its size is an option
+		self.imageEncoder = None #Created by parseOptions(), since its profile is an option
+		self.topImages = dict() #Maps image modes to the top image (see --top) converted to that mode
+		
+
+	def stringFromNodes( self, nodeList, useFormatting = True ):
+		'''Given a list of nodes, put them all into a string.
+		'''
+		result = ""
+		for node in nodeList:
+			prefix = ""
+			postfix = ""
+			
+			if useFormatting:
+				if node.isBold():
+					prefix = "*" + prefix
+					postfix = postfix + "*"
+				if node.isItalic():
+					prefix = "/" + prefix
+					postfix = postfix + "/"
+				if node.isUnderlined():
+					prefix = "_" + prefix
+					postfix = postfix + "_"
+			
+			result += prefix + node.word + postfix + " "
+		result.rstrip()
+		return result
+
+	def findCharsPerLine( self, text, normalFont, maxWidth ):
+		'''Find how many characters will fit within the specified width.
+			Args:
+				text: The string whose contents are used to test character width.
+				normalFont: The font used to test character width.
+				maxWidth: The maximum width in pixels.
+			Returns:
+				An integer indicating how many characters fit within maxWidth.
+		'''
+		
+		if maxWidth < 1:
+			maxWidth = 1
+		
+		charsPerLine = maxWidth // normalFont.getsize( "L" )[ 0 ] #Capital L is generaly a pretty wide character
+		
+		if charsPerLine < 1:
+			charsPerLine = 1
+		
+		while normalFont.getsize( text[ :charsPerLine ] )[ 0 ] > maxWidth:
+			charsPerLine -= 1
+		
+		if charsPerLine < 1:
+			charsPerLine = 1
+		
+		return charsPerLine
+
+	def rewrap_nodelistlist( self, nodeList, normalFont, boldFont, maxWidth, fontSize = 10, center=True ):
+		'''Rewrap and center text.
+			Args:
+				nodeList: A list of nodes containing the text to be wrapped.
+				normalFont: A non-bold font.
+				boldFont: A bold font.
+				maxWidth: The maximum width in pixels.
+				fontSize: Ignored.
+				center: A Boolean indicating whether text should be centered after wrapping. Spaces will be added around each line of text if true. Defaults to True.
+			Returns:
+				A list of lists of nodes.
+		'''
+		
+		boldNodes = dict()
+		italicNodes = dict()
+		underlinedNodes = dict()
+		for node in nodeList:
+			boldNodes[ node ] = node.isBold()
+			italicNodes[ node ] = node.isItalic()
+			underlinedNodes[ node] = node.isUnderlined()
+			if boldNodes[ node ]:
+				node.font = boldFont
+			else:
+				node.font = normalFont
+		
+		spaceWidth = self.textSizeCache.getSpaceWidth( normalFont )
+		
+		lineList = []
+		lineWidth = 0 #The width of the words in lineList, each followed by a space. Kept as a running total so the whole line doesn't get re-measured for every word.
+		temp = []
+		for node in nodeList:
+			wordWidth = self.textSizeCache.getWidth( node.font, node.word )
+			if lineWidth + wordWidth <= maxWidth:
+				lineList.append( node )
+				lineWidth += wordWidth + spaceWidth
+			elif wordWidth <= maxWidth:
+				temp.append( lineList )#stringFromNodes( lineList, useFormatting = False ) )
+				lineList = [ node ]
+				lineWidth = wordWidth + spaceWidth
+			else:
+				#temp.append( stringFromNodes( lineList, useFormatting = False ) )#.rstrip() )
+				#line = node.word + " "
+				if "\N{SOFT HYPHEN}" in node.word:
+					#Split on hyphens if there are any...
+					splitted = node.word.split( "\N{SOFT HYPHEN}", 1 )
+					firstSection = splitted[ 0 ] + "-"
+					secondSection = splitted[ 1 ]
+				elif "-" in node.word:
+					splitted = node.word.split( "-", 1 )
+					firstSection = splitted[ 0 ] + "-"
+					secondSection = splitted[ 1 ]
+				else:
+					middle = len( node.word ) // 2
+					firstSection = node.word[ :middle ] + "-"
+					secondSection = node.word[ middle: ]
+				
+				firstSectionNode = MarkovNode( firstSection, firstSection, node.isEnd, isBold = boldNodes[ node ], isItalic = italicNodes[ node ], isUnderlined = underlinedNodes[ node ], font = node.font, rng = node.rng )
+				secondSectionNode = MarkovNode( secondSection, secondSection, node.isEnd, isBold = boldNodes[ node ], isItalic = italicNodes[ node ], isUnderlined = underlinedNodes[ node ], font = node.font, rng = node.rng )
+				lineList.append( firstSectionNode )
+				temp.append( lineList )#stringFromNodes( lineList, useFormatting = False ) )
+				lineList = [ secondSectionNode ]
+				lineWidth = self.textSizeCache.getWidth( node.font, secondSection ) + spaceWidth
+		#line = line.rstrip()
+		temp.append( lineList )#stringFromNodes( lineList, useFormatting = False ) )
+		
+		temp2 = []
+		for nodeList in temp:
+			line = []
+			for node in nodeList:
+				try:
+					node.word = "".join( [ ch for ch in node.word if ch.isprintable() ] )
+				except AttributeError:
+					node.word = "".join( [ ch for ch in node.word if ch in string.printable ] )
+				
+				line.append( node )
+			temp2.append( line )
+		
+		result = []
+		for line in temp2:
+			lineWidth = 0 #normalFont.getsize( line )[ 0 ]
+			
+			for node in line:
+				lineWidth += spaceWidth + self.textSizeCache.getWidth( node.font, node.word )
+			
+			lineWidth -= spaceWidth
+			
+			if center and lineWidth < maxWidth:
+				difference = maxWidth - lineWidth
+				if spaceWidth > 0 and spaceWidth < difference:
+					difference = difference - spaceWidth
+					numberOfSpaces = int( ( difference / spaceWidth ) // 2 )
+					for i in range( numberOfSpaces ):
+						line.insert( 0, MarkovNode( word="", nonRandomizedWord="", font=normalFont ) ) #Spaces get inserted between nodes, so these nodes are blank
+					#line = spacesString + line
+			result.append( line )
+		
+		return result
+
+
+
+	def loadFonts( self, size ):
+		'''Get the normal and bold fonts at a given size from the font cache. Fonts that can't be loaded are replaced by PIL's default font.
+			Args:
+				size: The font size in pixels.
+			Returns:
+				A tuple: ( normal font, bold font ).
+		'''
+		normalFontFile, boldFontFile = self.getFontFiles()
+		return ( self.fontCache.getFont( normalFontFile, size ), self.fontCache.getFont( boldFontFile, size ) )
+	
+	def textFits( self, listoflists, normalFont, width, height ):
+		'''Determine whether wrapped text fits within a box.
+			Args:
+				listoflists: A list of lists of nodes, as returned by rewrap_nodelistlist().
+				normalFont: The non-bold font the text was wrapped with.
+				width: The width of the box in pixels.
+				height: The height of the box in pixels.
+			Returns:
+				A Boolean.
+		'''
+		totalHeight = 0
+		for line in listoflists:
+			lineWidth = 0
+			lineHeight = 0
+			for node in line:
+				wordSize = self.textSizeCache.getSize( normalFont, node.word + " " )
+				lineWidth += wordSize[ 0 ]
+				lineHeight = max( lineHeight, wordSize[ 1 ] )
+			lineWidth -= self.textSizeCache.getSpaceWidth( normalFont )
+			totalHeight += lineHeight
+			if lineWidth > width:
+				return False
+		
+		return totalHeight <= height
+	
+	def wrapTextAtSize( self, nodeList, width, height, size ):
+		'''Wrap text using fonts of a given size.
+			Args:
+				nodeList: A list of nodes containing the text.
+				width: The width of the box in pixels.
+				height: The height of the box in pixels.
+				size: The font size in pixels.
+			Returns:
+				A tuple: ( the wrapped text as returned by rewrap_nodelistlist(), a Boolean indicating whether it fits within the box ).
+		'''
+		normalFont, boldFont = self.loadFonts( size )
+		listoflists = self.rewrap_nodelistlist( nodeList, normalFont, boldFont, width, fontSize = size )
+		return ( listoflists, self.textFits( listoflists, normalFont, width, height ) )
+	
+	def fitTextToBox( self, nodeList, width, height ):
+		'''Find the largest font size at which some text fits within a box, and wrap the text at that size. Sizes are binary searched rather than tried one at a time from the largest down, since each size tried means loading two fonts and rewrapping all the text.
+			Args:
+				nodeList: A list of nodes containing the text.
+				width: The width of the box in pixels.
+				height: The height of the box in pixels.
+			Returns:
+				A tuple: ( the chosen font size, the wrapped text as returned by rewrap_nodelistlist(), the number of sizes tried ).
+		'''
+		maxSize = max( int( height * 1.2 ), 1 ) #Contrary to the claim by PIL's documentation, font sizes are apparently in pixels, not points. The size being requested is the height of a generic character; the actual height of any particular character will be approximately (not exactly) the requested size. The 1.2, used to account for the fact that real character sizes aren't exactly the same as the requested size, I just guessed an appropriate value.
+		
+		#Short text often fits at the largest size, so try that before searching
+		listoflists, fits = self.wrapTextAtSize( nodeList, width, height, maxSize )
+		numberOfProbes = 1
+		if fits:
+			return ( maxSize, listoflists, numberOfProbes )
+		
+		#Invariant: smallest fits (or is 1, the smallest size we'll use regardless), largest doesn't
+		smallest = 1
+		largest = maxSize
+		lastProbed = maxSize
+		while largest - smallest > 1:
+			size = ( smallest + largest ) // 2
+			listoflists, fits = self.wrapTextAtSize( nodeList, width, height, size )
+			numberOfProbes += 1
+			lastProbed = size
+			if fits:
+				smallest = size
+			else:
+				largest = size
+		
+		if lastProbed != smallest: #rewrap_nodelistlist() sets each node's font, so the nodes must be wrapped at the chosen size last
+			listoflists, fits = self.wrapTextAtSize( nodeList, width, height, smallest )
+			numberOfProbes += 1
+		
+		return ( smallest, listoflists, numberOfProbes )
+	
+	def getCacheDir( self ):
+		'''Find the directory in which to keep cached data. It's in the .markovcache directory next to (not inside) the input directory, with a subdirectory for each input directory, so that input directories which share a parent don't overwrite each other's caches.
+			Returns:
+				A string representing a path.
+		'''
+		inDir = os.path.abspath( self.inDir )
+		encodedInDir = inDir
+		if not isinstance( encodedInDir, bytes ):
+			encodedInDir = encodedInDir.encode( "utf-8" )
+		dirHash = hashlib.sha1( encodedInDir ).hexdigest()[ :12 ] #Tells apart input directories with the same name
+		return os.path.join( os.path.dirname( inDir ), ".markovcache", os.path.basename( inDir ) + "-" + dirHash )
+	
+	def getComicRandom( self, comicNumber ):
+		'''Get the random number generator for one comic. It depends only on the seed and the comic's number, so a comic comes out the same no matter which process generates it or what was generated before it.
+			Args:
+				comicNumber: Which comic this is, counting from 0 since the program started.
+			Returns:
+				A random.Random.
+		'''
+		return random.Random( "%d/%d" % ( self.seed, comicNumber ) )
+	
+	def getFontFiles( self ):
+		'''Find the font files to draw text with, if that hasn't been done yet. See FontFinder.findFontFiles().
+			Returns:
+				A tuple: ( path to the normal font, path to the bold font ). Either may be None, in which case PIL's default font is used.
+		'''
+		if self.fontFiles is None:
+			self.fontFiles = FontFinder( self.fontsDir, self.cacheDir ).findFontFiles( self.commandLineFont )
+			if not self.silence:
+				six.print_( "Using fonts:", self.fontFiles[ 0 ], "and", self.fontFiles[ 1 ] )
+		return self.fontFiles
+
+	def usage( self ):
+		'''Print command line usage info.
+		'''
+		six.print_( "😕" ) #In case of transcoding errors: this should be U+1F615, "confused face"
+		six.print_( "Usage: The program takes the following command line arguments:" )
+		 #the first character of each of these should be U+1F78D, "black slightly small square":
+		six.print_( "🞍 -a or --login-password: a password to log in to WordPress with. Only applicable in combination with --login-name and --WordPress-uri. Defaults to", self.loginPasswordDefault )
+		six.print_( "🞍 -b or --long-name: The comic's name, long form. Used when uploading to blogs. Defaults to the short form." )
+		six.print_( "🞍 -c or --comic-id: The ID number of a specific comic image to use. Useful for debugging. Defaults to a randomly selected ID." )
+		six.print_( "🞍 -d or --short-name: The comic's name, short form. Used when uploading to blogs. Defaults to", self.shortNameDefault )
+		six.print_( "🞍 --encoder: How to save comics. One of: lossless (full color, default compression), fast (256 colors, light compression), balanced (256 colors picked carefully, default compression), or smallest (216 fixed colors, maximum compression). The fast profile reuses the comic image's own palette when it has one. Defaults to", self.encoderProfileDefault )
+		six.print_( "🞍 -f or --font: The path to a font file to use." )
+		six.print_( "🞍 -g or --generate: The number of comics to generate. Defaults to", self.numberOfComicsDefault )
+		six.print_( "🞍 -h or --help: Display this usage info." )
+		six.print_( "🞍 -i or --indir: The directory in which to look for inputs (must have fonts/, images/, transcripts/, and word-bubbles/ subdirectories). Defaults to", self.inDirDefault )
+		six.print_( "🞍 --font-cache-size: How many fonts to keep loaded, so that font files don't have to be parsed again for every word bubble. Each size of each font counts separately. 0 turns the cache off. Defaults to", self.fontCacheSizeDefault )
+		six.print_( "🞍 --image-cache-size: How many megabytes of memory to use for keeping decoded comic images, so that comics which come up more than once don't have to be decoded again. 0 turns the cache off. Defaults to", self.imageCacheSizeDefault )
+		six.print_( "🞍 -j or --jobs: The number of worker processes to generate comics in. Only useful in combination with --generate. Defaults to", self.numberOfJobsDefault )
+		six.print_( "🞍 -l or --login-name: a username to log in to WordPress with. Only applicable in combination with --login-password and --WordPress-uri. Defaults to", self.loginNameDefault )
+		six.print_( "🞍 -n or --no-gui: Do not show a GUI. Defaults to ", self.noGUIDefault )
+		six.print_( "🞍 --no-local-output: Do not save comics or their transcripts to disk. Useful when uploading to blogs, which are sent comics straight from memory. Without a GUI, requires --WordPress-uri, since the comics would otherwise go nowhere. Defaults to", self.noLocalOutputDefault )
+		six.print_( "🞍 -o or --outtextfile: The name of a text file to save the resulting sentences to. Defaults to", self.outTextFileNameDefault )
+		six.print_( "🞍 --order: How many preceding words determine each generated word. Higher orders make sentences that are more grammatical but closer to the original dialog. Defaults to", self.orderDefault )
+		six.print_( "🞍 --queue-size: How many comics can wait between each stage of generating, saving, and uploading. Larger queues smooth out uneven stages at the cost of memory. Defaults to", self.queueSizeDefault )
+		six.print_( "🞍 -p or --outimagefile: The name of an image file to save the resulting comic to. Numbers will be appended if multiple comics are generated. Defaults to", self.outImageFileNameDefault )
+		six.print_( "🞍 --rebuild-cache: Rebuild the Markov graphs from the transcripts even if the cached copies in", self.cacheDir, "are up to date. Defaults to", self.rebuildCacheDefault )
+		six.print_( '🞍 -r or --randomize-capitals: Some comic fonts have alternate capital letter forms instead of lower-case letters. In that case, using random "upper-case" and "lower-case" letters actually results in all upper-case letters but with a somewhat more handwriting-like look. Defaults to', self.randomizeCapitalsDefault )
+		six.print_( "🞍 --seed: An integer which determines every random choice made, so that the same comics can be generated again. Defaults to a randomly chosen seed, which is shown unless --silent is specified." )
+		six.print_( "🞍 -s or --silent: Prevents output on standard out. Defaults to", self.silenceDefault )
+		six.print_( "🞍 -t or --top: The path to an image which will be appended at the top of each comic. Should be the same width as the comic images. Good for names or logos." )
+		six.print_( "🞍 --upload-connections: How many comics to upload to each blog at once, each over its own connection. More than 1 helps over slow links, but comics may then be posted out of order. Defaults to", self.uploadConnectionsDefault )
+		six.print_( "🞍 --upload-ledger: The path to a database recording which comics have been uploaded to which blogs. Comics already in it are not uploaded again, so a batch which stopped partway can be re-run with the same --seed without posting its comics twice. Defaults to uploads.sqlite in", self.cacheDir )
+		six.print_( "🞍 -u or --WordPress-uri: The URI of a WordPress blog's xmlrpc.php file. Specify this if you want the comic automatically uploaded as a blog post. Will probably require that --login-name and --login-password be specified too (this is up to WordPress, not us). Defaults to", self.WordPressURIDefault )
+		six.print_( "🞍 -w or --saveforweb: If specified, saves the images using settings which result in a smaller file size, possibly at the expense of image quality. Same as --encoder smallest." )
+
+
+	def isWritable( self, fileName ):
+		'''Tests whether a given file can be opened for writing.
+			Args:
+				fileName: A string representing the path to the file to be tested.
+			Returns:
+				True if file is writable, False otherwise
+		'''
+		if os.access( fileName, os.F_OK ): #file exists
+			return os.access( fileName, os.W_OK )
+		else: #file doesn't exist
+			try:
+				open( fileName, "w" )
+			except OSError:
+				return False
+			else:
+				os.remove( fileName )
+				return True
+
+
+
+	def parseOptions( self ):
+		try:
+			options, argsLeft = getopt.getopt( sys.argv[ 1: ], "swhni:o:p:g:f:t:ru:l:a:c:b:d:j:", [ "silent", "saveforweb", "help", "no-gui", "indir=", "outtextfile=", "outimagefile=", "generate=", "font=", "top=", "randomize-capitals", "WordPress-uri=", "login-name=", "login-password=", "comic-id=", "long-name=", "short-name=", "rebuild-cache", "order=", "jobs=", "seed=", "image-cache-size=", "font-cache-size=", "encoder=", "queue-size=", "upload-connections=", "no-local-output", "upload-ledger=" ] )
+		except getopt.GetoptError as error:
+			six.print_( error )
+			self.usage()
+			sys.exit( EX_USAGE );
+
+		for option in options:
+			if option[ 0 ] == "-s" or option[ 0 ] == "--silent":
+				self.silence = True
+			elif option[ 0 ] == "-i" or option[ 0 ] == "--indir":
+				self.inDir = option[ 1 ]
+			elif option[ 0 ] == "-o" or option[ 0 ] == "--outtextfile":
+				self.outTextFileName = option[ 1 ]
+			elif option[ 0 ] == "-p" or option[ 0 ] == "--outimagefile":
+				self.outImageFileName = option[ 1 ]
+			elif option[ 0 ] == "-g" or option[ 0 ] == "--generate":
+				try:
+					self.numberOfComics = int( option[ 1 ] )
+				except ValueError:
+					six.print_( "Error:", option[ 1 ], "is not a valid number of comics", file=sys.stderr )
+					exit( EX_USAGE )
+			elif option[ 0 ] == "-n" or option[ 0 ] == "--no-gui":
+				self.noGUI = True
+			elif option[ 0 ] == "-w" or option[ 0 ] == "--saveforweb":
+				self.saveForWeb = True
+				self.encoderProfile = "smallest"
+			elif option[ 0 ] == "--encoder":
+				if option[ 1 ] not in ImageEncoder.profiles:
+					six.print_( "Error:", option[ 1 ], "is not a valid encoder profile", file=sys.stderr )
+					exit( EX_USAGE )
+				self.encoderProfile = option[ 1 ]
+			elif option[ 0 ] == "-h" or option[ 0 ] == "--help":
+				self.usage()
+				sys.exit( EX_OK )
+			elif option[ 0 ] == "-f" or option[ 0 ] == "--font":
+				self.commandLineFont = option[ 1 ]
+			elif option[ 0 ] == "-t" or option[ 0 ] == "--top":
+				self.topImageFileName = option[ 1 ]
+			elif option[ 0 ] == "-r" or option[ 0 ] == "--randomize-capitals":
+				self.randomizeCapitals = True
+			elif option[ 0 ] == "-u" or option[ 0 ] == "--WordPress-uri":
+				self.WordPressURI = option[ 1 ]
+			elif option[ 0 ] == "-l" or option[ 0 ] == "--login-name":
+				self.loginName = option[ 1 ]
+			elif option[ 0 ] == "-a" or option[ 0 ] == "--login-password":
+				self.loginPassword = option[ 1 ]
+			elif option[ 0 ] == "-d" or option[ 0 ] == "--short-name":
+				self.shortName = option[ 1 ]
+			elif option[ 0 ] == "-b" or option[ 0 ] == "--long-name":
+				self.longName = option[ 1 ]
+			elif option[ 0 ] == "-c" or option[ 0 ] == "--comic-id":
+				self.commandLineComicID = option[ 1 ]
+			elif option[ 0 ] == "--upload-ledger":
+				self.uploadLedgerFileName = option[ 1 ]
+			elif option[ 0 ] == "--no-local-output":
+				self.noLocalOutput = True
+			elif option[ 0 ] == "--rebuild-cache":
+				self.rebuildCache = True
+			elif option[ 0 ] == "--order":
+				try:
+					self.order = int( option[ 1 ] )
+				except ValueError:
+					six.print_( "Error:", option[ 1 ], "is not a valid order", file=sys.stderr )
+					exit( EX_USAGE )
+			elif option[ 0 ] == "-j" or option[ 0 ] == "--jobs":
+				try:
+					self.numberOfJobs = int( option[ 1 ] )
+				except ValueError:
+					six.print_( "Error:", option[ 1 ], "is not a valid number of jobs", file=sys.stderr )
+					exit( EX_USAGE )
+			elif option[ 0 ] == "--queue-size":
+				try:
+					self.queueSize = int( option[ 1 ] )
+				except ValueError:
+					six.print_( "Error:", option[ 1 ], "is not a valid queue size", file=sys.stderr )
+					exit( EX_USAGE )
+			elif option[ 0 ] == "--upload-connections":
+				try:
+					self.uploadConnections = int( option[ 1 ] )
+				except ValueError:
+					six.print_( "Error:", option[ 1 ], "is not a valid number of upload connections", file=sys.stderr )
+					exit( EX_USAGE )
+			elif option[ 0 ] == "--image-cache-size":
+				try:
+					self.imageCacheSize = float( option[ 1 ] )
+				except ValueError:
+					six.print_( "Error:", option[ 1 ], "is not a valid image cache size", file=sys.stderr )
+					exit( EX_USAGE )
+			elif option[ 0 ] == "--font-cache-size":
+				try:
+					self.fontCacheSize = int( option[ 1 ] )
+				except ValueError:
+					six.print_( "Error:", option[ 1 ], "is not a valid font cache size", file=sys.stderr )
+					exit( EX_USAGE )
+			elif option[ 0 ] == "--seed":
+				try:
+					self.seed = int( option[ 1 ] )
+				except ValueError:
+					six.print_( "Error:", option[ 1 ], "is not a valid seed", file=sys.stderr )
+					exit( EX_USAGE )
+
+		if self.longName is None:
+			self.longName = self.shortName
+		
+		self.wordBubblesDir = os.path.join( self.inDir, "word-bubbles" )
+		self.fontsDir = os.path.join( self.inDir, "fonts" )
+		self.imageDir = os.path.join( self.inDir, "images" )
+		self.cacheDir = self.getCacheDir()
+		
+		if self.uploadLedgerFileName is None:
+			self.uploadLedgerFileName = os.path.join( self.cacheDir, "uploads.sqlite" )
+		
+		if self.WordPressURI is not None:
+			#Imported only when needed: most runs don't upload, and these pull in the XML-RPC, HTTP, and SQLite modules
+			import sqlite3
+			from uploader import WordPressUploader
+			from uploadledger import UploadLedger
+			
+			try:
+				uploadLedger = UploadLedger( self.uploadLedgerFileName )
+			except ( sqlite3.Error, OSError, IOError ) as error:
+				six.print_( "Error: Could not open upload ledger", self.uploadLedgerFileName, ":", error, file=sys.stderr )
+				exit( EX_CANTCREAT )
+			self.blogUploaders.append( WordPressUploader( self.WordPressURI, self.loginName, self.loginPassword, maxConnections = self.uploadConnections, ledger = uploadLedger ) )
+		
+		if self.seed is None:
+			self.seed = random.randrange( 2 ** 32 )
+		
+		self.imageCache = ImageCache( maxBytes = int( self.imageCacheSize * 1000 * 1000 ) )
+		self.fontCache = FontCache( maxFonts = self.fontCacheSize )
+		self.imageEncoder = ImageEncoder( self.encoderProfile )
+
+
+		#Verify user input
+		#commandLineFont is not verified here; it will be verified when loading the font.
+		if not os.path.isdir( self.inDir ):
+			six.print_( "Error:", self.inDir, "is not a directory.", file=sys.stderr )
+			exit( EX_NOINPUT )
+		elif self.noLocalOutput and self.noGUI and len( self.blogUploaders ) == 0:
+			six.print_( "Error: --no-local-output was given without a GUI or any blogs to upload to, so the comics would be thrown away.", file=sys.stderr )
+			exit( EX_USAGE )
+		elif not self.noLocalOutput and os.path.exists( self.outTextFileName ) and not os.path.isfile(self. outTextFileName ):
+			six.print_( "Error:", self.outTextFileName, "is not a file.", file=sys.stderr )
+			exit( EX_CANTCREAT )
+		elif not self.noLocalOutput and not self.isWritable( self.outTextFileName ):
+			six.print_( "Error:", self.outTextFileName, "is not writable.", file=sys.stderr )
+			exit( EX_CANTCREAT )
+		elif not self.noLocalOutput and os.path.exists( self.outImageFileName ) and not os.path.isfile( self.outImageFileName ):
+			six.print_( "Error:",self. outImageFileName, "is not a file.", file=sys.stderr )
+			exit( EX_CANTCREAT )
+		elif not self.noLocalOutput and not self.isWritable( self.outImageFileName ):
+			six.print_( "Error:", self.outImageFileName, "is not writable.", file = sys.stderr )
+			exit( EX_CANTCREAT )
+		elif self.order < 1:
+			six.print_( "Error: Order (", self.order, ") is less than 1.", file=sys.stderr )
+			exit( EX_USAGE )
+		elif self.numberOfComics < 1:
+			six.print_( "Error: Number of comics (", self.numberOfComics, ") is less than 1.", file=sys.stderr )
+			exit( EX_USAGE )
+		elif self.imageCacheSize < 0:
+			six.print_( "Error: Image cache size (", self.imageCacheSize, ") is less than 0.", file=sys.stderr )
+			exit( EX_USAGE )
+		elif self.fontCacheSize < 0:
+			six.print_( "Error: Font cache size (", self.fontCacheSize, ") is less than 0.", file=sys.stderr )
+			exit( EX_USAGE )
+		elif self.numberOfJobs < 1:
+			six.print_( "Error: Number of jobs (", self.numberOfJobs, ") is less than 1.", file=sys.stderr )
+			exit( EX_USAGE )
+		elif self.queueSize < 1:
+			six.print_( "Error: Queue size (", self.queueSize, ") is less than 1.", file=sys.stderr )
+			exit( EX_USAGE )
+		elif self.uploadConnections < 1:
+			six.print_( "Error: Number of upload connections (", self.uploadConnections, ") is less than 1.", file=sys.stderr )
+			exit( EX_USAGE )
+		elif self.topImageFileName != None:
+			if not os.path.exists( self.topImageFileName ):
+				six.print_( "Error:", self.topImageFileName, "does not exist.", file=sys.stderr )
+				exit( EX_NOINPUT )
+			elif not os.path.isfile( self.topImageFileName ):
+				six.print_( "Error:", self.topImageFileName, "is not a file.", file=sys.stderr )
+				exit( EX_NOINPUT )
+			elif not os.access( self.topImageFileName, os.R_OK ):
+				six.print_( "Error:", self.topImageFileName, "is not readable (permission error - did you mess up a chmod?)", file = sys.stderr )
+				exit( EX_NOPERM )
+		elif self.loginName is not None and len( self.loginName ) < 1:
+			six.print_( "Error: loginName has length zero." )
+			exit( EX_USAGE )
+		elif self.loginPassword is not None and len( self.loginPassword ) < 1:
+			six.print_( "Error: loginPassword has length zero." )
+			exit( EX_USAGE )
+		elif ( self.commandLineComicID is not None ) and not idChecker.checkString( self.commandLineComicID ):
+			six.print_( "Error:", self.commandLineComicID, "is not a valid comic ID" )
+			exit( EX_USAGE )
+
+
+	
+	def prepareGenerators( self ):
+		'''Build the Markov graphs for all characters, or load them from the cache, if that hasn't been done yet.
+		'''
+		if self.generatorSet is None:
+			self.generatorSet = GeneratorSet( cm = self.commentMark, randomizeCapitals = self.randomizeCapitals, order = self.order, seed = self.seed )
+			graphCache = GraphCache( self.cacheDir, cm = self.commentMark, order = self.order )
+			if self.rebuildCache or not graphCache.load( self.inDir, self.generatorSet ):
+				if not self.silence:
+					six.print_( "Now building the Markov graphs for all characters..." )
+				self.generatorSet.buildGraphs( self.inDir )
+				graphCache.save( self.inDir, self.generatorSet )
+			
+			if not self.silence:
+				self.generatorSet.showStats()
+	
+	def prepareWordBubbleIndex( self ):
+		'''Index the word bubble files, or load the index from the cache, if that hasn't been done yet.
+		'''
+		if self.wordBubbleIndex is None:
+			self.wordBubbleIndex = WordBubbleIndex( self.wordBubblesDir, self.cacheDir, cm = self.commentMark )
+			try:
+				self.wordBubbleIndex.load( silence = self.silence )
+			except OSError as error:
+				six.print_( error, file=sys.stderr )
+				exit( EX_NOINPUT )
+			
+			if not self.silence:
+				self.wordBubbleIndex.showStats()
+	
+	def getSourceIndex( self ):
+		'''Get the index of sources.tsv, creating it if that hasn't been done yet.
+			Returns:
+				A SourceIndex.
+		'''
+		if self.sourceIndex is None:
+			self.sourceIndex = SourceIndex( os.path.join( self.inDir, "sources.tsv" ), cm = self.commentMark )
+		return self.sourceIndex
+	
+	def getOriginalURL( self, comicID ):
+		'''Find where the original, unedited version of a comic can be found, according to sources.tsv.
+			Args:
+				comicID: The comic's ID, as a string.
+			Returns:
+				A string (preferably a URL), or None if sources.tsv doesn't list the comic or doesn't exist.
+		'''
+		return self.getSourceIndex().getSource( comicID )
+	
+	def getTopImage( self, mode ):
+		'''Get the image that goes at the top of each comic, decoding it only the first time it's needed in each mode.
+			Args:
+				mode: The PIL image mode to convert the image to.
+			Returns:
+				A PIL Image, which must not be modified.
+		'''
+		if mode not in self.topImages:
+			try:
+				self.topImages[ mode ] = Image.open( self.topImageFileName ).convert( mode=mode )
+			except IOError as error:
+				six.print_( error, file=sys.stderr )
+				exit( EX_NOINPUT )
+		return self.topImages[ mode ]
+	
+	def getNumberedFileName( self, fileName, comicNumber ):
+		'''Get the name of an output file for one of several comics.
+			Args:
+				fileName: The output file name given on the command line.
+				comicNumber: Which comic the file is for, counting from 0.
+			Returns:
+				fileName with the comic number inserted before the extension, or fileName itself if only one comic is being generated.
+		'''
+		if self.numberOfComics > 1:
+			temp = os.path.splitext( fileName )
+			fileName = temp[ 0 ] + str( comicNumber ) + temp[ 1 ]
+		return fileName
+	
+	def generateComics( self ):
+		'''Generate, save, and upload numberOfComics comics. Each of those steps is a pipeline stage with a thread of its own, so that e.g. one comic can be uploading while the next is being compressed and the one after that is being drawn. With more than one job, worker processes generate and save the comics instead, and only uploading is done by a separate stage.
+			Returns:
+				The same as generateComic() returns for the last comic. If the comics were generated by worker processes, the image is None; it can be loaded from the saved file (or, with --no-local-output, the file's contents) instead.
+		'''
+		self.prepareGenerators()
+		self.prepareWordBubbleIndex()
+		self.getSourceIndex().refresh() #Read sources.tsv now, so that worker processes don't each have to
+		self.getFontFiles() #Before forking any workers, so they don't each have to do it
+		
+		if not self.silence:
+			six.print_( "Random seed:", self.seed )
+		
+		pool = None
+		workerStats = dict() #Maps the process IDs of workers to the latest cache stats they sent
+		firstStage = uploadStage = PipelineStage( "Upload", self.uploadComic, self.queueSize, numberOfThreads = self.uploadConnections ) #Each thread uploads over its own connection
+		if self.numberOfJobs > 1 and self.numberOfComics > 1:
+			import multiprocessing #Imported only when needed, since most runs don't use worker processes
+			if hasattr( multiprocessing, "get_context" ):
+				context = multiprocessing.get_context( "fork" ) #Workers get the already-built Markov graphs (and everything else) by inheriting our memory, so they must be forked, not spawned.
+			else:
+				context = multiprocessing
+			
+			global workerEngine
+			workerEngine = self
+			self.wordBubbleIndex.takeNewBackgrounds() #Already in the index, so the workers shouldn't send them back
+			pool = context.Pool( processes = min( self.numberOfJobs, self.numberOfComics ) )
+			items = pool.imap( generateComicInWorker, range( self.numberOfComics ) ) #imap returns results in order, so uploads happen in the same order as without workers
+		else:
+			saveStage = PipelineStage( "Save", self.saveComic, self.queueSize, nextStage = uploadStage )
+			firstStage = PipelineStage( "Render", self.renderComic, self.queueSize, nextStage = saveStage )
+			items = range( self.numberOfComics )
+		
+		firstStage.start()
+		try:
+			for item in items:
+				if firstStage.failed():
+					break
+				if pool is not None:
+					workerID, stats, newBackgrounds, item = item
+					workerStats[ workerID ] = stats #Each worker's stats include all of its earlier comics, so only the latest are kept
+					for comicID, backgrounds, backgroundStamp in newBackgrounds: #Workers' indexes don't get saved, so this one must learn what they computed
+						self.wordBubbleIndex.setBackgrounds( comicID, backgrounds, backgroundStamp )
+				firstStage.put( item )
+		except WorkerExit as error:
+			pool.terminate()
+			exit( error.args[ 0 ] )
+		firstStage.finish()
+		firstStage.join()
+		
+		if pool is not None:
+			pool.close()
+			pool.join()
+		
+		if not self.silence:
+			firstStage.showStats()
+			if pool is None:
+				self.showCacheStats()
+			else:
+				self.showCacheStats( list( workerStats.values() ) )
+		firstStage.raiseError() #Errors in comic generation exit the program, so this exits with the same status as if there were no stages
+		
+		self.numberOfComicsGenerated += self.numberOfComics
+		self.wordBubbleIndex.saveIfChanged() #Saves any word bubble backgrounds computed in this process or sent by workers
+		
+		return uploadStage.lastResult
+	
+	def getCacheStats( self ):
+		'''Get the stats of the caches and the image encoder, so that worker processes can send theirs to the main process.
+			Returns:
+				A dictionary mapping the names of the caches to what their getStats() methods return.
+		'''
+		return { "textSizeCache": self.textSizeCache.getStats(), "fontCache": self.fontCache.getStats(), "imageCache": self.imageCache.getStats(), "imageEncoder": self.imageEncoder.getStats() }
+	
+	def showCacheStats( self, workerStats = None ):
+		'''Shows how well the caches and the image encoder worked on standard output.
+			Args:
+				workerStats: A list of what getCacheStats() returned in each worker process, whose stats are then added up and shown instead of this process's own. Defaults to None.
+		'''
+		if not workerStats:
+			stats = self.getCacheStats()
+		else:
+			six.print_( "Caches and image encoder, added up over " + str( len( workerStats ) ) + " worker processes:" )
+			stats = dict()
+			for cacheStats in workerStats:
+				for cacheName, numbers in cacheStats.items():
+					total = stats.setdefault( cacheName, dict() )
+					for name, number in numbers.items():
+						total[ name ] = total.get( name, 0 ) + number
+		
+		self.textSizeCache.showStats( stats[ "textSizeCache" ] )
+		self.fontCache.showStats( stats[ "fontCache" ] )
+		self.imageCache.showStats( stats[ "imageCache" ] )
+		self.imageEncoder.showStats( stats[ "imageEncoder" ] )
+	
+	def uploadComic( self, savedComic ):
+		'''Upload a saved comic to every blog given on the command line.
+			Args:
+				savedComic: A tuple as returned by generateComic().
+			Returns:
+				savedComic, unchanged.
+		'''
+		outImageFileName, transcript, originalURL, image, imageData = savedComic
+		for blog in self.blogUploaders:
+			blog.upload( postStatus = "publish", inputFileName = outImageFileName, inputData = imageData, shortComicTitle = self.shortName, longComicTitle = self.longName, transcript = transcript, originalURL = originalURL, silence = self.silence )
+		return savedComic
+	
+	def generateComic( self, comicNumber, keepImage = True ):
+		'''Generate one comic and save it (and its transcript) to disk.
+			Args:
+				comicNumber: Which comic this is, counting from 0. Used to number the output files if more than one comic is being generated.
+				keepImage: Whether to return the image. Worker processes don't, to avoid sending whole images back to the main process.
+			Returns:
+				A tuple: ( the name of the saved image file, the transcript, the URL of the original comic or None, the image or None, the encoded image file's contents or None ). The file's contents are only kept when they're needed: for uploading, or because --no-local-output means the file wasn't saved.
+		'''
+		return self.saveComic( self.renderComic( comicNumber ), keepImage )
+	
+	def renderComic( self, comicNumber ):
+		'''Generate one comic's text and draw it onto the comic's image, without saving anything.
+			Args:
+				comicNumber: Which comic this is, counting from 0.
+			Returns:
+				A tuple: ( comicNumber, the comic's ID, the name of the comic's original image file, the transcript, the URL of the original comic or None, the image ), to be passed to saveComic().
+		'''
+		rng = self.getComicRandom( self.numberOfComicsGenerated + comicNumber )
+		
+		if self.commandLineComicID is None:
+			comicID = self.wordBubbleIndex.chooseComicID( rng )
+			if comicID is None:
+				six.print_( "Error: There are no usable word bubble files in", self.wordBubblesDir, file=sys.stderr )
+				exit( EX_NOINPUT )
+		else:
+			comicID = self.commandLineComicID
+		
+		wordBubbleFileName = self.wordBubbleIndex.getFileName( comicID )
+		if not self.silence:
+			six.print_( "wordBubbleFileName:", wordBubbleFileName )
+		
+		wordBubbles = self.wordBubbleIndex.getEntry( comicID )
+		if wordBubbles is None:
+			error = self.wordBubbleIndex.getError( comicID )
+			if error is None:
+				six.print_( "Error: Word bubble file", wordBubbleFileName, "does not exist.", file=sys.stderr )
+				exit( EX_NOINPUT )
+			else:
+				six.print_( "Error: Word bubble file", wordBubbleFileName, error, file=sys.stderr )
+				exit( EX_DATAERR )
+		
+		speakers = wordBubbles.speakers
+		
+		if not self.silence:
+			six.print_( "These characters speak:", speakers )
+		
+		for speaker in speakers:
+			if speaker not in self.generators:
+				self.generators[ speaker ] = self.generatorSet.getGenerator( speaker )
+				
+				if not self.silence:
+					self.generators[ speaker ].showStats()
+		
+		if not self.silence:
+			six.print_( comicID )
+		
+		inImageFileName = os.path.join( self.imageDir, comicID + ".png" )
+		
+		try:
+			if self.topImageFileName is None:
+				comicImage = image = self.imageCache.getImage( inImageFileName ) #A copy, converted from any palette-based mode since text rendering looks better that way
+				imageTop = 0
+			else:
+				#The comic is drawn straight onto a canvas which already has the top image on it, rather than onto a copy of the comic which then gets copied below the top image
+				comicImage = self.imageCache.getImage( inImageFileName, copy = False )
+				topImage = self.getTopImage( comicImage.mode )
+				imageTop = topImage.size[ 1 ]
+				image = Image.new( mode=comicImage.mode, size=( max( topImage.size[ 0 ], comicImage.size[ 0 ] ), imageTop + comicImage.size[ 1 ] ) )
+				image.paste( im=topImage, box=( 0, 0 ) )
+				image.paste( im=comicImage, box=( 0, imageTop ) )
+		except IOError as error:
+			six.print_( error, file=sys.stderr )
+			exit( EX_NOINPUT )
+		
+		backgrounds = self.wordBubbleIndex.getBackgrounds( comicID, inImageFileName, comicImage ) #Before anything is drawn on the image
+		
+		transcript = str( comicID ) + "\n"
+		
+		previousBox = ( int( -1 ), int( -1 ), int( -1 ), int( -1 ) ) #For detecting when two characters share a speech bubble; don't generate text twice.
+		
+		for bubbleNumber, ( character, box ) in enumerate( wordBubbles.bubbles ): #The index has already checked that every character is in speakers
+			generator = self.generators[ character ]
+			topLeftX, topLeftY, bottomRightX, bottomRightY = box
+			
+			if box != previousBox:
+				previousBox = box
+				
+				text = ""
+				nodeList = generator.generateSentences( 1, rng )[ 0 ]
+				for node in nodeList:
+					text += node.word + " "
+				text.rstrip()
+				
+				oneCharacterTranscript = character + ": "
+				oneCharacterTranscript += self.stringFromNodes( nodeList )
+				if not self.silence:
+					six.print_( oneCharacterTranscript )
+				oneCharacterTranscript += "\n"
+				transcript += oneCharacterTranscript
+				
+				width = bottomRightX - topLeftX
+				if width <= 0: #Width must be positive
+					width = 1
+				height = bottomRightY - topLeftY
+				if height <= 0:
+					height = 1
+				
+				size, listoflists, numberOfProbes = self.fitTextToBox( nodeList, width, height )
+				if not self.silence:
+					six.print_( "Font size", size, "chosen after", numberOfProbes, "probes" )
+				
+				margin = 0
+				offset = originalOffset = 0
+				
+				try: #Choose a text color that will be visible against the background
+					backgroundColor = backgrounds[ bubbleNumber ]
+					textColorList = []
+					
+					useIntegers = False
+					useFloats = False
+					if image.mode.startswith( "1" ):
+						bandMax = 1
+						useIntegers = True
+					elif image.mode.startswith( "L" ) or image.mode.startswith( "P" ) or image.mode.startswith( "RGB" ) or image.mode.startswith( "CMYK" ) or image.mode.startswith( "YCbCr" ) or image.mode.startswith( "LAB" ) or image.mode.startswith( "HSV" ):
+						bandMax = 255
+						useIntegers = True
+					elif image.mode.startswith( "I" ):
+						bandMax = 2147483647 #max for a 32-bit signed integer
+						useIntegers = True
+					elif image.mode.startswith( "F" ):
+						bandMax = float( "infinity" )
+						useFloats = True
+					else: #I've added all modes currently supported according to Pillow documentation; this is for future compatibility
+						bandMax = max( ImageStat.Stat( image ).extrema )
+					
+					for c in backgroundColor:
+						d = bandMax - ( c * 1.5 )
+						
+						if d < 0:
+							d = 0
+						
+						if useIntegers:
+							d = int( d )
+						elif useFloats:
+							d = float( d )
+						
+						textColorList.append( d )
+					
+					if image.mode.endswith( "A" ): #Pillow supports two modes with alpha channels
+						textColorList[ -1 ] = bandMax
+					
+					textColor = tuple( textColorList )
+					
+				except ValueError:
+					textColor = "black"
+				
+				#The text is drawn into a mask the size of the bubble, and the text color is painted through it onto the image. This avoids copying the bubble's part of the image out and back in.
+				textMask = Image.new( "L", ( width, height ), 0 )
+				draw = ImageDraw.Draw( textMask )
+				
+				offset = originalOffset
+				for line in listoflists:
+					xOffset = 0
+					yOffsetAdditional = 0
+					for node in line:
+						usedFont = node.font
+						draw.text( ( margin + xOffset, offset ), node.word + " ", font = usedFont, fill = 255 )
+						tempSize = self.textSizeCache.getSize( usedFont, node.word + " " )
+						xOffset += tempSize[ 0 ]
+						yOffsetAdditional = max( yOffsetAdditional, tempSize[ 1 ] )
+						node.unselectStyle()
+					offset += yOffsetAdditional
+				
+				image.paste( textColor, ( topLeftX, imageTop + topLeftY, topLeftX + width, imageTop + topLeftY + height ), textMask )
+		
+		originalURL = self.getOriginalURL( comicID )
+		if not self.silence: #Here rather than in saveComic(), which runs in another thread, so that everything printed about a comic stays together
+			six.print_( "Original comic URL:", originalURL )
+		
+		return ( comicNumber, comicID, inImageFileName, transcript, originalURL, image )
+	
+	def saveComic( self, renderedComic, keepImage = True ):
+		'''Save a comic made by renderComic() (and its transcript) to disk, unless --no-local-output was given.
+			Args:
+				renderedComic: A tuple as returned by renderComic().
+				keepImage: See generateComic().
+			Returns:
+				The same as generateComic().
+		'''
+		comicNumber, comicID, inImageFileName, transcript, originalURL, image = renderedComic
+		
+		outTextFileName = self.getNumberedFileName( self.outTextFileName, comicNumber )
+		
+		#---------------------------Split into separate function
+		if not self.noLocalOutput:
+			try:
+				#os.makedirs( os.path.dirname( outTextFileName ), exist_ok = True )
+				outFile = open( outTextFileName, mode="wt" )
+			except OSError as error:
+				six.print_( error, "\nUsing standard output instead", file=sys.stderr )
+				outFile = sys.stdout
+			
+			six.print_( transcript, file=outFile )
+			
+			outFile.close()
+		
+		outImageFileName = self.getNumberedFileName( self.outImageFileName, comicNumber )
+		
+		transcriptWithURL = transcript
+		if originalURL is not None:
+			transcriptWithURL += "\n" + originalURL #The transcript that gets embedded into the image file should include the URL. The transcript that gets uploaded to blogs doesn't need it, as the URL gets sent anyway.
+		
+		infoToSave = PngInfo()
+		
+		encodingErrors = "backslashreplace" #If we encounter errors during text encoding, I feel it best to replace unencodable text with escape sequences; that way it may be possible for reader programs to recover the original unencodable text.
+		
+		#According to the Pillow documentation, key names should be "latin-1 encodable". I take this to mean that we ourselves don't need to encode it in latin-1.
+		key = "transcript"
+		keyUTF8 = key.encode( "utf-8", errors=encodingErrors )
+		
+		if six.PY2:
+			tempencode = transcriptWithURL.decode( 'ascii', errors='replace' ) # I really don't like using this ascii-encoded intermediary called tempencode, but i couldn't get the program to work when encoding directly to latin-1
+			transcriptISO = tempencode.encode( "iso-8859-1", errors='replace' )
+			transcriptUTF8 = tempencode.encode( "utf-8", errors='replace' )
+		else:
+			transcriptISO = transcriptWithURL.encode( "iso-8859-1", errors=encodingErrors )
+			transcriptUTF8 = transcriptWithURL.encode( "utf-8", errors=encodingErrors )
+		
+		
+		infoToSave.add_itxt( key=key, value=transcriptUTF8, tkey=keyUTF8 )
+		infoToSave.add_text( key=key, value=transcriptISO )
+		
+		#GIMP only recognizes comments
+		key = "Comment"
+		keyUTF8 = key.encode( "utf-8", errors=encodingErrors )
+		
+		infoToSave.add_text( key=key, value=transcriptISO )
+		infoToSave.add_itxt( key=key, value=transcriptUTF8, tkey=keyUTF8 )
+		
+		try:
+			#os.makedirs( os.path.dirname( outImageFileName ), exist_ok = True )
+			if self.topImageFileName is None:
+				palette = self.imageCache.getPalette( inImageFileName )
+			else: #The top image's colors probably aren't in the comic's palette
+				palette = None
+			
+			imageData = None
+			if self.noLocalOutput or len( self.blogUploaders ) > 0: #Encode into memory, so that uploaders don't have to read the file back from disk
+				outImageFile = six.BytesIO()
+				image = self.imageEncoder.encode( image, outImageFile, pnginfo=infoToSave, palette=palette )
+				imageData = outImageFile.getvalue()
+				if not self.noLocalOutput:
+					outImageFile = open( outImageFileName, "wb" )
+					try:
+						outImageFile.write( imageData )
+					finally:
+						outImageFile.close()
+			else:
+				image = self.imageEncoder.encode( image, outImageFileName, pnginfo=infoToSave, palette=palette )
+		except IOError as error:
+			six.print_( error, file = sys.stderr )
+			exit( EX_CANTCREAT )
+		except OSError as error:
+			six.print_( error, file = sys.stderr )
+			exit( EX_CANTCREAT )
+		
+		if keepImage:
+			return ( outImageFileName, transcript, originalURL, image, imageData )
+		else:
+			return ( outImageFileName, transcript, originalURL, None, imageData )
+	
+class WorkerExit( Exception ):
+	'''Raised in the main process when a worker process tried to exit, so that the main process can exit with the same status.
+	'''
+	pass
+
+workerEngine = None #The ComicEngine that worker processes generate comics with. Set in the main process just before the workers are forked, so they inherit it along with its Markov graphs.
+
+def generateComicInWorker( comicNumber ):
+	'''Generate one comic in a worker process.
+		Args:
+			comicNumber: Which comic to generate, counting from 0.
+		Returns:
+			A tuple: ( the worker's process ID, what ComicEngine.getCacheStats() returns in the worker, what WordBubbleIndex.takeNewBackgrounds() returns in the worker, what ComicEngine.generateComic() returns minus the image ).
+	'''
+	try:
+		savedComic = workerEngine.generateComic( comicNumber, keepImage = False )
+		return ( os.getpid(), workerEngine.getCacheStats(), workerEngine.wordBubbleIndex.takeNewBackgrounds(), savedComic )
+	except SystemExit as error:
+		raise WorkerExit( error.code )
@@ -0,0 +1,174 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import six
+import sys
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+class TextSizeCache:
+	def __init__( self, maxSizes = 20000 ):
+		'''Remembers how big pieces of text are when rendered in a given font. Measuring text means laying it out glyph by glyph, and the same words get measured over and over: once per word while wrapping, again while centering, again while checking whether a font size fits, and again while drawing, for every font size that gets tried.
+			Args:
+				maxSizes: The most sizes to remember at once. When more are measured, the least recently used is forgotten. Each comic measures a few hundred new pieces of text, so this keeps the sizes for the words common to many comics without growing forever over a long batch. Defaults to 20000.
+		'''
+		self.maxSizes = maxSizes
+		self.sizes = OrderedDict() #Maps ( font file, font size, text ) to the size of the text, least recently used first
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+	
+	def getFontKey( self, font ):
+		'''Find what identifies a font for caching purposes. Fonts are reloaded for every word bubble, so two font objects loaded from the same file at the same size must share cache entries.
+			Args:
+				font: A PIL ImageFont.
+			Returns:
+				A tuple.
+		'''
+		path = getattr( font, "path", None )
+		if path is None: #Not a TrueType font, e.g. one from ImageFont.load_default(). Those have no file or size, so fall back to the object itself (which also keeps it alive, so its identity can't be reused by another font).
+			return ( font, None )
+		return ( path, font.size )
+	
+	def getSize( self, font, text ):
+		'''Get the size of some text, measuring it only if it hasn't been measured before.
+			Args:
+				font: A PIL ImageFont.
+				text: A string.
+			Returns:
+				A tuple: ( width, height ) in pixels.
+		'''
+		key = self.getFontKey( font ) + ( text, )
+		size = self.sizes.pop( key, None )
+		if size is None:
+			self.misses += 1
+			size = font.getsize( text )
+		else:
+			self.hits += 1
+		self.sizes[ key ] = size #(Re-)inserting the size makes it the most recently used
+		
+		while len( self.sizes ) > self.maxSizes:
+			self.sizes.popitem( last = False )
+			self.evictions += 1
+		
+		return size
+	
+	def getWidth( self, font, text ):
+		'''Get the width of some text. See getSize().
+			Args:
+				font: A PIL ImageFont.
+				text: A string.
+			Returns:
+				An integer.
+		'''
+		return self.getSize( font, text )[ 0 ]
+	
+	def getSpaceWidth( self, font ):
+		'''Get the width of a space. Words are separated by spaces, so this is needed once per word.
+			Args:
+				font: A PIL ImageFont.
+			Returns:
+				An integer.
+		'''
+		return self.getSize( font, " " )[ 0 ]
+	
+	def getStats( self ):
+		'''Get the numbers showStats() shows. Worker processes each have their own cache, so this lets theirs be added up.
+			Returns:
+				A dictionary mapping names to numbers.
+		'''
+		return { "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "stored": len( self.sizes ), "maxStored": self.maxSizes }
+	
+	def showStats( self, stats = None ):
+		'''Shows how well the cache is working on standard output.
+			Args:
+				stats: A dictionary as returned by getStats(), or several of them added up. Defaults to this cache's own.
+		'''
+		if stats is None:
+			stats = self.getStats()
+		lookups = stats[ "hits" ] + stats[ "misses" ]
+		if lookups > 0:
+			hitRate = 100 * stats[ "hits" ] // lookups
+		else:
+			hitRate = 0
+		six.print_( "Text size cache: " + str( stats[ "hits" ] ) + " hits, " + str( stats[ "misses" ] ) + " misses (" + str( hitRate ) + "% hit rate), " + str( stats[ "evictions" ] ) + " evictions, " + str( stats[ "stored" ] ) + " of at most " + str( stats[ "maxStored" ] ) + " sizes stored." )
+
+class FontCache:
+	def __init__( self, maxFonts = 1024 ):
+		'''Keeps recently used fonts loaded. Loading a TrueType font means parsing the whole font file, and the same few sizes of the same few files are needed for every word bubble of every comic.
+			Args:
+				maxFonts: The most fonts to keep loaded at once. When more are needed, the least recently used is dropped. Fitting text into word bubbles tries a few hundred different sizes of both the normal and the bold font over a batch, and a loaded font takes up a few dozen kilobytes, so the default of 1024 keeps all of them loaded for the fonts that come with the program. 0 turns the cache off.
+		'''
+		self.maxFonts = maxFonts
+		self.fonts = OrderedDict() #Maps ( font file, font size, variant ) to the loaded font, least recently used first
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+	
+	def getFont( self, path, size, variant = 0 ):
+		'''Get a font, loading it only if it isn't already loaded. If a font file can't be loaded, PIL's default font is cached in its place, so each broken font file is only reported once.
+			Args:
+				path: The path to a TrueType font file, or None for PIL's default font.
+				size: The font size in pixels. Ignored for PIL's default font, which only comes in one size.
+				variant: Which font face to use, for files that contain more than one. Defaults to 0.
+			Returns:
+				A PIL ImageFont.
+		'''
+		if path is None:
+			key = ( None, None, 0 )
+		else:
+			key = ( path, size, variant )
+		
+		font = self.fonts.pop( key, None )
+		if font is None:
+			self.misses += 1
+			font = self.loadFont( path, size, variant )
+		else:
+			self.hits += 1
+		self.fonts[ key ] = font #(Re-)inserting the font makes it the most recently used
+		
+		while len( self.fonts ) > self.maxFonts:
+			self.fonts.popitem( last = False )
+			self.evictions += 1
+		
+		return font
+	
+	def loadFont( self, path, size, variant ):
+		'''Load a font without looking in the cache. See getFont().
+			Args:
+				path: The path to a TrueType font file, or None for PIL's default font.
+				size: The font size in pixels.
+				variant: Which font face to use.
+			Returns:
+				A PIL ImageFont.
+		'''
+		if path is None:
+			return ImageFont.load_default()
+		
+		try:
+			return ImageFont.truetype( path, size = size, index = variant )
+		except IOError as error:
+			six.print_( error, "\nUsing default font instead.", file=sys.stderr )
+			return self.getFont( None, None )
+	
+	def getStats( self ):
+		'''Get the numbers showStats() shows. See TextSizeCache.getStats().
+			Returns:
+				A dictionary mapping names to numbers.
+		'''
+		return { "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "stored": len( self.fonts ), "maxStored": self.maxFonts }
+	
+	def showStats( self, stats = None ):
+		'''Shows how well the cache is working on standard output.
+			Args:
+				stats: A dictionary as returned by getStats(), or several of them added up. Defaults to this cache's own.
+		'''
+		if stats is None:
+			stats = self.getStats()
+		lookups = stats[ "hits" ] + stats[ "misses" ]
+		if lookups > 0:
+			hitRate = 100 * stats[ "hits" ] // lookups
+		else:
+			hitRate = 0
+		six.print_( "Font cache: " + str( stats[ "hits" ] ) + " hits, " + str( stats[ "misses" ] ) + " misses (" + str( hitRate ) + "% hit rate), " + str( stats[ "evictions" ] ) + " evictions, " + str( stats[ "stored" ] ) + " of at most " + str( stats[ "maxStored" ] ) + " fonts loaded." )
@@ -0,0 +1,172 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import six
+import hashlib
+import json
+import os
+import sys
+
+
+class FontFinder:
+	formatVersion = 1 #Increase this whenever the format of the saved result changes, so that old results get ignored.
+	fontExtensions = ( ".ttf", ".otf", ".ttc" )
+	normalStyles = ( "medium", "regular", "normal", "book" ) #Font files whose names contain these are preferred for non-bold text
+	
+	def __init__( self, fontsDir, cacheDir ):
+		'''Decides which font files to draw text with. Searching the system's fonts is slow (pygame enumerates every installed font), so it is only done when there's no better choice, and its result is saved for next time.
+			Args:
+				fontsDir: The input directory's 'fonts' subdirectory. Fonts found here are used in preference to system fonts.
+				cacheDir: The directory in which to save the result of searching the system's fonts.
+		'''
+		self.fontsDir = fontsDir
+		self.cacheDir = cacheDir
+	
+	def findFontFiles( self, commandLineFont = None ):
+		'''Find the font files to use, in order of preference: the one specified on the command line, the ones in fontsDir, or matching system fonts.
+			Args:
+				commandLineFont: The path to a font file specified on the command line, or None. If given, it is used for both normal and bold text.
+			Returns:
+				A tuple: ( path to the normal font, path to the bold font ). Either may be None if no suitable font could be found.
+		'''
+		if commandLineFont is not None:
+			return ( commandLineFont, commandLineFont )
+		
+		fontFiles = self.findFontsInDirectory()
+		if fontFiles is not None:
+			return fontFiles
+		
+		key = self.computeKey()
+		fontFiles = self.loadResult( key )
+		if fontFiles is None:
+			fontFiles = self.findSystemFonts()
+			if fontFiles is None: #The search couldn't be done, which isn't worth remembering
+				return ( None, None )
+			self.saveResult( key, fontFiles )
+		return fontFiles
+	
+	def listFontDirectory( self ):
+		'''List the readable font files in fontsDir.
+			Returns:
+				A sorted list of file names (not paths). Empty if fontsDir doesn't exist.
+		'''
+		if not os.path.isdir( self.fontsDir ):
+			return []
+		
+		result = []
+		for fileName in sorted( os.listdir( self.fontsDir ) ):
+			path = os.path.join( self.fontsDir, fileName )
+			if os.path.splitext( fileName )[ 1 ].lower() in self.fontExtensions and os.path.isfile( path ) and os.access( path, os.R_OK ):
+				result.append( fileName )
+		return result
+	
+	def findFontsInDirectory( self ):
+		'''Choose normal and bold fonts from the files in fontsDir, going by their names.
+			Returns:
+				A tuple: ( path to the normal font, path to the bold font ), or None if fontsDir has no font files. If there's no bold font, the normal font is used for both.
+		'''
+		fileNames = self.listFontDirectory()
+		if len( fileNames ) == 0:
+			return None
+		
+		boldFileNames = [ fileName for fileName in fileNames if "bold" in fileName.lower() ]
+		otherFileNames = [ fileName for fileName in fileNames if fileName not in boldFileNames ]
+		normalFileNames = [ fileName for fileName in otherFileNames if any( style in fileName.lower() for style in self.normalStyles ) ]
+		
+		normalFileName = ( normalFileNames + otherFileNames + boldFileNames )[ 0 ]
+		boldFileName = ( boldFileNames + [ normalFileName ] )[ 0 ]
+		return ( os.path.join( self.fontsDir, normalFileName ), os.path.join( self.fontsDir, boldFileName ) )
+	
+	def computeKey( self ):
+		'''Compute a hash of fontsDir's contents. If a font gets added to or removed from fontsDir, the key changes and the system's fonts get searched again.
+			Returns:
+				A string of hexadecimal digits.
+		'''
+		keyHash = hashlib.sha1()
+		keyHash.update( ( "%d %s\n" % ( self.formatVersion, os.path.abspath( self.fontsDir ) ) ).encode( "utf-8" ) )
+		if os.path.isdir( self.fontsDir ):
+			for fileName in sorted( os.listdir( self.fontsDir ) ):
+				fileStat = os.stat( os.path.join( self.fontsDir, fileName ) )
+				keyHash.update( ( "%s\t%d\t%r\n" % ( fileName, fileStat.st_size, fileStat.st_mtime ) ).encode( "utf-8" ) )
+		return keyHash.hexdigest()
+	
+	def getFileName( self ):
+		'''Get the name of the file in which the result of searching the system's fonts is saved.
+			Returns:
+				A string representing a path.
+		'''
+		return os.path.join( self.cacheDir, "fonts.json" )
+	
+	def loadResult( self, key ):
+		'''Load a previously saved result of searching the system's fonts.
+			Args:
+				key: A string as returned by computeKey().
+			Returns:
+				A tuple like findFontFiles() returns, or None if there's no saved result for this key or the fonts it names no longer exist.
+		'''
+		try:
+			resultFile = open( self.getFileName(), "rt" )
+			try:
+				saved = json.load( resultFile )
+			finally:
+				resultFile.close()
+			
+			if saved[ "key" ] != key:
+				return None
+			fontFiles = ( saved[ "normal" ], saved[ "bold" ] )
+		except ( IOError, OSError, ValueError, KeyError, TypeError ):
+			return None
+		
+		for fontFile in fontFiles:
+			if fontFile is not None and not os.path.isfile( fontFile ):
+				return None
+		return fontFiles
+	
+	def saveResult( self, key, fontFiles ):
+		'''Save the result of searching the system's fonts.
+			Args:
+				key: A string as returned by computeKey().
+				fontFiles: A tuple like findFontFiles() returns.
+			Returns:
+				True if the result was saved, False otherwise.
+		'''
+		fileName = self.getFileName()
+		tempFileName = fileName + ".tmp" + str( os.getpid() )
+		try:
+			if not os.path.isdir( self.cacheDir ):
+				os.makedirs( self.cacheDir )
+			
+			resultFile = open( tempFileName, "wt" )
+			try:
+				json.dump( { "key": key, "normal": fontFiles[ 0 ], "bold": fontFiles[ 1 ] }, resultFile )
+			finally:
+				resultFile.close()
+			os.rename( tempFileName, fileName )
+		except ( IOError, OSError ) as error:
+			six.print_( "Warning: Could not save font search results to", self.cacheDir, ":", error, file=sys.stderr )
+			return False
+		return True
+	
+	def findSystemFonts( self ):
+		'''Find installed normal and bold fonts from a list of known comic-ish font families.
+			Returns:
+				A tuple: ( path to the normal font, path to the bold font ), either of which may be None if no suitable font could be found. None instead of a tuple if the system's fonts couldn't be searched.
+		'''
+		try:
+			import pygame #Imported here rather than at the top because importing pygame is slow, and it's only needed when there are no fonts in fontsDir
+		except ImportError as error:
+			six.print_( "Warning: Could not search the system's fonts:", error, file=sys.stderr )
+			return None
+		
+		#There's no standard "comic" font style, so instead we use a list of known comic-ish font families. Feel free to add to the list or to reorder it however you want. Ubuntu Titling isn't very comic-ish; I just wanted something that doesn't resemble Arial or Times to come after Comic Sans.
+		#families = [ "Nina Improved", "Nina", "Humor Sans", "Tomson Talks", "Nibby", "Vipond Comic LC", "Vipond Comic UC", "Comic Neue", "Comic Neue Angular", "Comic Relief", "Dekko", "Ruji's Handwriting Font", "Open Comic Font", "Comic Sans MS", "Ubuntu Titling" ]
+		families = [ "ninaimproved", "nina", "humorsans", "tomsontalks", "nibby", "vipondcomiclc", "vipondcomicuc", "comicneue", "comicneueangular", "comicrelief", "dekko", "ruji'shandwritingfont", "opencomicfont", "comicsansms", "ubuntutitling" ]
+		result = []
+		for preferBold in ( False, True ):
+			fontFile = None
+			for family in families:
+				fontFile = pygame.font.match_font( family, bold=preferBold )
+				if fontFile is not None:
+					break
+			result.append( fontFile )
+		return tuple( result )
@@ -5,77 +5,108 @@ import six
 import os
 import random
 import sys
+from timeit import default_timer
 
 from idchecker import idChecker
-from markovnode import MarkovNode
+from markovmodel import MarkovModel, MarkovModelBuilder
 
 
 class Generator:
-	def __init__( self, charLabel, cm = "//", randomizeCapitals = False ):
+	def __init__( self, charLabel, cm = "//", randomizeCapitals = False, order = 1, seed = None ):
 		'''Just does what the name implies.
 			Args:
 				charLabel: A string naming which comic character this generator represents.
 				cm: A string used to mark the beginning of comments. Including it here ensures that this object will use the same kind of comment marker as the rest of the program. Defaults to "//".
 				randomizeCapitals: Whether to randomize the capitalization of each letter.
+				order: How many of the preceding words determine the next word. Higher orders produce sentences closer to the original dialog. Defaults to 1.
+				seed: If not None, randomized capitalization is derived from this seed instead of the random module's shared generator, so it can be reproduced. Defaults to None.
 		'''
+		if order < 1:
+			raise ValueError( "order must be at least 1" )
+		
 		self.charLabel = charLabel.upper()
-		self.lines = []
 		self.commentMark = cm
 		self.randomizeCapitals = randomizeCapitals
-		self.numInputWords = 0
-		self.numInputSentences = 0
+		self.order = order
+		self.seed = seed
+		self.model = MarkovModel()
+		self.randomizedWords = dict() #Maps word IDs to randomized words, so that each word keeps the same capitalization every time it is generated
 	
-	def randomBoolean( self, probability = 0.5 ):
+	def randomBoolean( self, probability = 0.5, rng = None ):
 		'''Get a random true or false value, with the given probability of being true.
 			Args:
 				probability: a number between 0.0 and 1.0 inclusive. Defaults to 0.5.
+				rng: The random.Random to use. Defaults to the random module's shared generator.
 			Returns:
 				A Boolean.
 		'''
 		if probability < 0 or probability > 1:
 			raise ValueError( "probability must be between 0 and 1 inclusive" )
 		
-		return( random.random() <= probability )
+		if rng is None:
+			rng = random
+		return( rng.random() <= probability )
+	
+	def getWordRandom( self, wordID ):
+		'''Get the random number generator that decides a word's capitalization. With a seed, every word gets its own generator, so a word's capitalization doesn't depend on which comics happened to be generated before it, or in which process.
+			Args:
+				wordID: The word's ID number.
+			Returns:
+				A random.Random, or the random module itself if this generator has no seed.
+		'''
+		if self.seed is None:
+			return random
+		return random.Random( "%s/%s/%d" % ( self.seed, self.charLabel, wordID ) )
+	
+	def randomizeWord( self, word, rng = None ):
+		'''Randomize the capitalization of each letter in a word, if this generator is supposed to do that.
+			Args:
+				word: The word to randomize.
+				rng: The random.Random to use. Defaults to the random module's shared generator.
+			Returns:
+				The randomized word, or the word itself if randomizeCapitals is False.
+		'''
+		if not self.randomizeCapitals:
+			return word
+		
+		wordRandomized = ""
+		for letter in word:
+			if self.randomBoolean( rng = rng ):
+				letter = letter.upper()
+			else:
+				letter = letter.lower()
+			wordRandomized += letter
+		return wordRandomized
 	
 	def showStats( self ):
 		'''Shows a few stats on standard output. Shouldn't be called before buildGraph().
 		'''
-		if self.numInputSentences > 0:
-			six.print_( "Character " + self.charLabel + " has a total of " + str( self.numInputWords ) + " words over " + str( self.numInputSentences ) + " sentences for an average of " + str( self.numInputWords / self.numInputSentences ) + " words/sentence.")
+		numInputWords = self.model.numInputWords
+		numInputSentences = self.model.numInputSentences
+		if numInputSentences > 0:
+			six.print_( "Character " + self.charLabel + " has a total of " + str( numInputWords ) + " words over " + str( numInputSentences ) + " sentences for an average of " + str( numInputWords / numInputSentences ) + " words/sentence.")
 		else:
-			six.print_( "Character " + self.charLabel + " has a total of " + str( self.numInputWords ) + " words." )
+			six.print_( "Character " + self.charLabel + " has a total of " + str( numInputWords ) + " words." )
+		six.print_( "Character " + self.charLabel + "'s order " + str( self.order ) + " Markov graph has " + str( len( self.model.words ) ) + " words, " + str( self.countStates() ) + " states, and " + str( self.countEdges() ) + " edges." )
 	
 	def buildGraph( self, inDir ):
-		'''Build the Markov graph for this generator's comic character.
+		'''Build the Markov graph for this generator's comic character. To build graphs for several characters, GeneratorSet.buildGraphs() is much faster since it reads the transcripts only once.
 			Args:
 				inDir: The directory in which to find the 'transcripts' subdirectory. The 'transcripts' subdirectory is where we will actually look for everything.
 		'''
-		transcriptDir = os.path.join( inDir, "transcripts" )
-		
-		for inFileName in os.listdir( transcriptDir ):
-			inFileName = os.path.join( transcriptDir, inFileName )
-			inFile = open( inFileName, mode="rt" )
-			
-			idc = idChecker()
-			if not idc.checkFile( inFile, inFileName, self.commentMark ):
-				six.print_( "Error: File", inFileName, "is not a properly formatted transcript.", file=sys.stderr )
-				break;
-		
-			for line in inFile:
-				line = line.partition( self.commentMark )[ 0 ].strip()
-				if( len( line ) > 0 ):
-					line = line.split()
-					speaker = line[ 0 ].rstrip(":").strip()
-					if speaker.upper() == self.charLabel:
-						dialog = line[1:]
-						self.lines.append( dialog )
-			
-			inFile.close()
-			
-		self.nodes = dict()
-		self.sentenceStarts = []
-		previousWord = None
-		for line in self.lines:
+		reader = TranscriptReader( self.commentMark )
+		reader.read( inDir )
+		self.buildGraphFromLines( reader.linesByCharacter.get( self.charLabel, [] ) )
+	
+	def buildGraphFromLines( self, lines ):
+		'''Build the Markov graph for this generator's comic character from dialog that has already been read.
+			Args:
+				lines: A list of ( lists of ( strings ) ), each list of strings being the words of one line of dialog spoken by this character.
+		'''
+		builder = MarkovModelBuilder( self.order )
+		previousWordID = None
+		state = ()
+		for line in lines:
 			if( len( line ) > 0 ):
 				for word in line:
 					isBold = "*" in word
@@ -84,61 +115,197 @@ class Generator:
 					word = word.strip("*/_") #Remove emphasis
 					
 					if len( word ) > 0:
-						self.numInputWords += 1
+						builder.numInputWords += 1
 						isEnd = ( word.endswith( ( ".", "?", "!", '."', '?"', '!"', ".'", "?'", "!'" ) ) or word == line[ -1 ].strip("*/_") )
 						
 						if isEnd:
-							self.numInputSentences += 1
-						
-						if word not in self.nodes.keys():
-							wordRandomized = ""
-							if self.randomizeCapitals:
-								for letter in word:
-									if self.randomBoolean():
-										letter = letter.upper()
-									else:
-										letter = letter.lower()
-									wordRandomized += letter
-							else:
-								wordRandomized = word
-							self.nodes[ word ] = MarkovNode( wordRandomized, word, isEnd )
-							
-						if not previousWord == None:
-							if self.nodes[ previousWord ].isEnd:
-								self.sentenceStarts.append( word )
-							else:
-								self.nodes[ previousWord ].addLink( self.nodes[ word ] )
-						else:
-							if word not in self.sentenceStarts:
-								self.sentenceStarts.append( word )
+							builder.numInputSentences += 1
 						
-						if isBold:
-							self.nodes[ word ].addBold()
-						if isItalic:
-							self.nodes[ word ].addItalic()
-						if isUnderlined:
-							self.nodes[ word ].addUnderlined()
+						wordID = builder.addWord( word, isEnd, isBold, isItalic, isUnderlined )
 						
-						if not isBold and not isItalic and not isUnderlined:
-							self.nodes[ word ].addNormal()
+						if previousWordID is None or builder.isEnd[ previousWordID ]:
+							builder.addSentenceStart( wordID )
+							state = ()
+						else:
+							builder.addTransition( state, wordID )
 						
-						previousWord = word
+						previousWordID = wordID
+						state = ( state + ( wordID, ) )[ -self.order: ]
+		
+		self.model = builder.build()
+		self.randomizedWords = dict()
+	
+	def countStates( self ):
+		'''Count the states in the Markov graph that have at least one word following them. For order 1, states are single words.
+			Returns:
+				An integer.
+		'''
+		return self.model.countStates()
 	
-	def generateSentences(self, numberOfSentences = 1):
+	def countEdges( self ):
+		'''Count the distinct transitions from a state to a following word.
+			Returns:
+				An integer.
+		'''
+		return self.model.countEdges()
+	
+	def setModel( self, model ):
+		'''Use an already-built Markov graph (e.g. one loaded by a GraphCache) instead of calling buildGraph().
+			Args:
+				model: A MarkovModel.
+		'''
+		if model.order != self.order:
+			raise ValueError( "model has order " + str( model.order ) + ", not " + str( self.order ) )
+		
+		self.model = model
+		self.randomizedWords = dict()
+	
+	def generateSentences(self, numberOfSentences = 1, rng = None):
 		'''Generate some number of sentences (paths through the Markov graph).
 			Args:
 				numberOfSentences: The number of sentences to generate. Defaults to 1.
+				rng: The random.Random to choose words and styles with. Passing each comic its own generator makes the comic reproducible. Defaults to the random module's shared generator.
 			Returns:
 				A list of ( lists of( Markov nodes ) ), each Markov node representing one word and each list of Markov nodes representing one sentence.
 		'''
 		result = []
 		for i in range ( numberOfSentences ):
-			currentWord = random.choice( self.sentenceStarts )
-			sentence = [ self.nodes[ currentWord ] ]
-			while self.nodes[ currentWord ].hasLinks() and not self.nodes[ currentWord ].isEnd:
-				currentWord = self.nodes[ currentWord ].getRandomLinkedNode().nonRandomizedWord
-				#sentence += " " + currentWord
-				sentence.append( self.nodes[ currentWord ] )
+			sentence = []
+			for wordID in self.model.generateSentence( rng ):
+				if not self.randomizeCapitals:
+					sentence.append( self.model.makeNode( wordID, rng = rng ) )
+					continue
+				
+				if wordID not in self.randomizedWords:
+					self.randomizedWords[ wordID ] = self.randomizeWord( self.model.words[ wordID ], self.getWordRandom( wordID ) )
+				sentence.append( self.model.makeNode( wordID, self.randomizedWords[ wordID ], rng ) )
 			
 			result.append( sentence )
 		return result
+
+
+class TranscriptReader:
+	def __init__( self, cm = "//" ):
+		'''Reads the dialog out of every transcript file, sorting it by character.
+			Args:
+				cm: A string used to mark the beginning of comments. Defaults to "//".
+		'''
+		self.commentMark = cm
+		self.linesByCharacter = dict() #Maps each (upper-cased) character label to a list of that character's lines of dialog, each line being a list of words.
+		self.numFilesRead = 0
+		self.numLinesRead = 0
+	
+	def read( self, inDir ):
+		'''Read all the transcripts.
+			Args:
+				inDir: The directory in which to find the 'transcripts' subdirectory.
+		'''
+		transcriptDir = os.path.join( inDir, "transcripts" )
+		
+		for inFileName in sorted( os.listdir( transcriptDir ) ):
+			inFileName = os.path.join( transcriptDir, inFileName )
+			inFile = open( inFileName, mode="rt" )
+			
+			idc = idChecker()
+			if not idc.checkFile( inFile, inFileName, self.commentMark ):
+				six.print_( "Error: File", inFileName, "is not a properly formatted transcript.", file=sys.stderr )
+				inFile.close()
+				continue
+			
+			for line in inFile:
+				line = line.partition( self.commentMark )[ 0 ].strip()
+				if( len( line ) > 0 ):
+					self.numLinesRead += 1
+					line = line.split()
+					speaker = line[ 0 ].rstrip(":").strip().upper()
+					self.linesByCharacter.setdefault( speaker, [] ).append( line[1:] )
+			
+			inFile.close()
+			self.numFilesRead += 1
+
+
+class GeneratorSet:
+	def __init__( self, cm = "//", randomizeCapitals = False, order = 1, seed = None ):
+		'''A collection of generators, one per comic character, all built from a single pass over the transcripts.
+			Args:
+				cm: A string used to mark the beginning of comments. Defaults to "//".
+				randomizeCapitals: Whether to randomize the capitalization of each letter.
+				order: How many of the preceding words determine the next word. See Generator. Defaults to 1.
+				seed: The seed for randomized capitalization. See Generator. Defaults to None.
+		'''
+		self.commentMark = cm
+		self.randomizeCapitals = randomizeCapitals
+		self.order = order
+		self.seed = seed
+		self.generators = dict()
+		self.numFilesRead = 0
+		self.numLinesRead = 0
+		self.buildTime = 0.0
+		self.loadedFromCache = False
+	
+	def buildGraphs( self, inDir ):
+		'''Read the transcripts once and build the Markov graphs for every character label found in them.
+			Args:
+				inDir: The directory in which to find the 'transcripts' subdirectory.
+			Returns:
+				A dictionary mapping each (upper-cased) character label to its Generator.
+		'''
+		startTime = default_timer()
+		
+		reader = TranscriptReader( self.commentMark )
+		reader.read( inDir )
+		
+		for charLabel in reader.linesByCharacter:
+			newGenerator = Generator( charLabel = charLabel, cm = self.commentMark, randomizeCapitals = self.randomizeCapitals, order = self.order, seed = self.seed )
+			newGenerator.buildGraphFromLines( reader.linesByCharacter[ charLabel ] )
+			self.generators[ newGenerator.charLabel ] = newGenerator
+		
+		self.numFilesRead = reader.numFilesRead
+		self.numLinesRead = reader.numLinesRead
+		self.buildTime = default_timer() - startTime
+		return self.generators
+	
+	def setModels( self, models, numFilesRead, numLinesRead, loadTime ):
+		'''Use already-built Markov graphs (e.g. ones loaded by a GraphCache) instead of calling buildGraphs().
+			Args:
+				models: A dictionary mapping each character label to its MarkovModel.
+				numFilesRead: The number of transcript files the graphs were originally built from.
+				numLinesRead: The number of lines of dialog the graphs were originally built from.
+				loadTime: How long, in seconds, it took to load the graphs.
+			Returns:
+				A dictionary mapping each (upper-cased) character label to its Generator.
+		'''
+		self.generators = dict()
+		for charLabel in models:
+			newGenerator = Generator( charLabel = charLabel, cm = self.commentMark, randomizeCapitals = self.randomizeCapitals, order = self.order, seed = self.seed )
+			newGenerator.setModel( models[ charLabel ] )
+			self.generators[ newGenerator.charLabel ] = newGenerator
+		
+		self.numFilesRead = numFilesRead
+		self.numLinesRead = numLinesRead
+		self.buildTime = loadTime
+		self.loadedFromCache = True
+		return self.generators
+	
+	def getGenerator( self, charLabel ):
+		'''Get the generator for a character. Characters who never speak in the transcripts get an empty generator.
+			Args:
+				charLabel: A string naming the comic character.
+			Returns:
+				A Generator.
+		'''
+		charLabel = charLabel.upper()
+		if charLabel not in self.generators:
+			newGenerator = Generator( charLabel = charLabel, cm = self.commentMark, randomizeCapitals = self.randomizeCapitals, order = self.order, seed = self.seed )
+			newGenerator.buildGraphFromLines( [] )
+			self.generators[ charLabel ] = newGenerator
+		return self.generators[ charLabel ]
+	
+	def showStats( self ):
+		'''Shows a few stats on standard output. Shouldn't be called before buildGraphs().
+		'''
+		if self.loadedFromCache:
+			six.print_( "Loaded cached Markov graphs for " + str( len( self.generators ) ) + " characters (originally read from " + str( self.numLinesRead ) + " lines in " + str( self.numFilesRead ) + " files) in " + "%.3f" % self.buildTime + " seconds." )
+			return
+		
+		six.print_( "Built Markov graphs for " + str( len( self.generators ) ) + " characters from " + str( self.numLinesRead ) + " lines in " + str( self.numFilesRead ) + " files in " + "%.3f" % self.buildTime + " seconds." )
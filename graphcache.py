@@ -0,0 +1,157 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import six
+import hashlib
+import mmap
+import os
+import sys
+from array import array
+from timeit import default_timer
+
+from markovmodel import MarkovModel, arrayToBytes, bytesFromBuffer, intArrayFromBuffer, intSize
+
+
+class GraphCache:
+	formatVersion = 6 #Increase this whenever the format of the cached data changes, so that old cache files get ignored.
+	magicNumber = 0x4d4b5643 #"MKVC" when stored big-endian. Identifies cache files.
+	byteOrderMark = 0x01020304 #Cache files store integers in the machine's native byte order; if this reads back differently, the file came from some other kind of machine.
+	headerLength = 6 #The number of integers at the start of a cache file. See save().
+	
+	def __init__( self, cacheDir, cm = "//", order = 1 ):
+		'''A directory of compiled Markov graphs, so that we don't have to rebuild them from the transcripts on every run.
+			Cache files are memory-mapped rather than read, and the Markov graphs are used directly from the mapped memory. Every process using the same cache file therefore shares one copy of the graphs, and loading takes next to no time no matter how big the graphs are.
+			Args:
+				cacheDir: The directory in which to keep the cache files. Will be created if it doesn't exist.
+				cm: A string used to mark the beginning of comments. The comment mark affects how transcripts are parsed, so it is part of the cache key. Defaults to "//".
+				order: The order of the Markov graphs (see Generator). Graphs of each order are cached separately. Defaults to 1.
+		'''
+		self.cacheDir = cacheDir
+		self.commentMark = cm
+		self.order = order
+		self.mappedFiles = [] #The graphs loaded by load() point into these, so they must stay open
+	
+	def computeKey( self, inDir ):
+		'''Compute a hash of the transcript files' names, sizes, and modification times. If any transcript gets added, removed, or changed, the key changes.
+			Args:
+				inDir: The directory in which to find the 'transcripts' subdirectory.
+			Returns:
+				A string of hexadecimal digits.
+		'''
+		transcriptDir = os.path.join( inDir, "transcripts" )
+		
+		keyHash = hashlib.sha1()
+		keyHash.update( ( "%d %d %d %s\n" % ( self.formatVersion, sys.version_info[ 0 ], self.order, self.commentMark ) ).encode( "utf-8" ) )
+		for fileName in sorted( os.listdir( transcriptDir ) ):
+			fileStat = os.stat( os.path.join( transcriptDir, fileName ) )
+			keyHash.update( ( "%s\t%d\t%r\n" % ( fileName, fileStat.st_size, fileStat.st_mtime ) ).encode( "utf-8" ) )
+		return keyHash.hexdigest()
+	
+	def getFileName( self, key ):
+		'''Get the name of the cache file for a given key.
+			Args:
+				key: A string as returned by computeKey().
+			Returns:
+				A string representing a path.
+		'''
+		return os.path.join( self.cacheDir, "graphs-" + str( self.order ) + "-" + key + ".mkv" )
+	
+	def load( self, inDir, generatorSet ):
+		'''Fill a GeneratorSet from the cache, if the cache is up to date.
+			Args:
+				inDir: The directory in which to find the 'transcripts' subdirectory.
+				generatorSet: The GeneratorSet to fill.
+			Returns:
+				True if the generators were loaded, False if there was no usable cache entry (in which case the caller should build the graphs itself).
+		'''
+		fileName = self.getFileName( self.computeKey( inDir ) )
+		if not os.path.isfile( fileName ):
+			return False
+		
+		startTime = default_timer()
+		try:
+			cacheFile = open( fileName, "rb" )
+			try:
+				mappedFile = mmap.mmap( cacheFile.fileno(), 0, access = mmap.ACCESS_READ )
+			finally:
+				cacheFile.close() #The mapping stays valid after the file is closed
+			
+			if sys.version_info[ 0 ] < 3:
+				buffer = mappedFile
+			else:
+				buffer = memoryview( mappedFile )
+			
+			header = intArrayFromBuffer( buffer, 0, self.headerLength )
+			magicNumber, byteOrderMark, formatVersion, numFilesRead, numLinesRead, numModels = [ header[ index ] for index in range( self.headerLength ) ]
+			if magicNumber != self.magicNumber or byteOrderMark != self.byteOrderMark or formatVersion != self.formatVersion:
+				raise ValueError( "not a cache file of the current format" )
+			
+			#The header is followed by one ( label start, label end, model start ) entry per model, then the labels, then the models.
+			entries = intArrayFromBuffer( buffer, self.headerLength * intSize, numModels * 3 )
+			models = dict()
+			for index in range( numModels ):
+				labelStart, labelEnd, modelStart = entries[ index * 3 : index * 3 + 3 ]
+				model = MarkovModel()
+				model.loadFromBuffer( buffer, modelStart )
+				models[ bytesFromBuffer( buffer, labelStart, labelEnd ).decode( "utf-8" ) ] = model
+		except Exception as error: #A corrupt or unreadable cache file is no worse than a missing one.
+			six.print_( "Warning: Could not load cached Markov graphs from", fileName, ":", error, file=sys.stderr )
+			return False
+		
+		self.mappedFiles.append( mappedFile )
+		generatorSet.setModels( models, numFilesRead, numLinesRead, default_timer() - startTime )
+		return True
+	
+	def save( self, inDir, generatorSet ):
+		'''Save a GeneratorSet's graphs into the cache, replacing any outdated cache files.
+			Args:
+				inDir: The directory in which to find the 'transcripts' subdirectory.
+				generatorSet: The GeneratorSet to save. Its graphs must already have been built.
+			Returns:
+				True if the cache was written, False otherwise.
+		'''
+		fileName = self.getFileName( self.computeKey( inDir ) )
+		tempFileName = fileName + ".tmp" + str( os.getpid() )
+		
+		charLabels = sorted( generatorSet.generators.keys() )
+		encodedLabels = b"".join( [ charLabel.encode( "utf-8" ) for charLabel in charLabels ] )
+		
+		entries = array( "i" )
+		labelPosition = ( self.headerLength + len( charLabels ) * 3 ) * intSize
+		modelPosition = labelPosition + len( encodedLabels ) + ( -len( encodedLabels ) % intSize )
+		modelBlobs = []
+		for charLabel in charLabels:
+			labelLength = len( charLabel.encode( "utf-8" ) )
+			modelBlobs.append( generatorSet.generators[ charLabel ].model.toBytes() )
+			entries.extend( [ labelPosition, labelPosition + labelLength, modelPosition ] )
+			labelPosition += labelLength
+			modelPosition += len( modelBlobs[ -1 ] )
+		
+		header = array( "i", [ self.magicNumber, self.byteOrderMark, self.formatVersion, generatorSet.numFilesRead, generatorSet.numLinesRead, len( charLabels ) ] )
+		
+		try:
+			if not os.path.isdir( self.cacheDir ):
+				os.makedirs( self.cacheDir )
+			
+			cacheFile = open( tempFileName, "wb" )
+			try:
+				cacheFile.write( arrayToBytes( header ) )
+				cacheFile.write( arrayToBytes( entries ) )
+				cacheFile.write( encodedLabels + b"\0" * ( -len( encodedLabels ) % intSize ) )
+				for modelBlob in modelBlobs:
+					cacheFile.write( modelBlob )
+			finally:
+				cacheFile.close()
+			os.rename( tempFileName, fileName )
+		except ( IOError, OSError ) as error:
+			six.print_( "Warning: Could not save Markov graphs to", self.cacheDir, ":", error, file=sys.stderr )
+			return False
+		
+		for oldFileName in os.listdir( self.cacheDir ):
+			if oldFileName.startswith( "graphs-" + str( self.order ) + "-" ) and oldFileName.endswith( ".mkv" ) and oldFileName != os.path.basename( fileName ): #Only finished files, not the temporary file another run might be writing at the moment
+				try:
+					os.remove( os.path.join( self.cacheDir, oldFileName ) )
+				except OSError: #Probably still mapped by another process, on a system that doesn't allow removing such files. It can be removed next time.
+					pass
+		
+		return True
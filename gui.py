@@ -0,0 +1,54 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import six
+from PIL import Image
+
+import kivy
+kivy.require("1.9.1") #my current version as of 2016-09-13. Beware of using older versions.
+from kivy.app import App
+from kivy.uix.widget import Widget
+from kivy.graphics.texture import Texture
+
+class MarkovApp( App ): #Kivy finds markov.kv by this class's name, so don't rename it
+	
+	class MarkovGUI( Widget ):
+		def __init__( self,  **kwargs ):
+			'''Initialize the generator object.
+				Args:
+					**kwargs: Ignored by this class, passed to parent class.
+			'''
+			super( MarkovApp.MarkovGUI, self ).__init__( **kwargs );
+			#self.generateButton.bind( on_press=generateComics )
+	
+	def __init__( self, engine ):
+		'''A front end for a ComicEngine which shows the generated comics.
+			Args:
+				engine: The ComicEngine to generate comics with. Its options should already have been parsed.
+		'''
+		super( MarkovApp, self ).__init__()
+		self.engine = engine
+	
+	def build( self ):
+		'''Create whatever widgets the app needs to start. Other widgets may be created later.
+		'''
+		self.gui = MarkovApp.MarkovGUI();
+		self.gui.generateButton.bind( on_press=self.generateComics )
+		return self.gui
+	
+	def generateComics( self, instance = None ):
+		'''Generate, save, and upload comics, then display the last one.
+			Args:
+				instance: The widget that triggered generation. Ignored.
+		'''
+		outImageFileName, transcript, originalURL, image, imageData = self.engine.generateComics()
+		
+		if image is None: #The comic was made by a worker process, which saved it but didn't send it back to us
+			if imageData is None:
+				image = Image.open( outImageFileName )
+			else:
+				image = Image.open( six.BytesIO( imageData ) )
+		if image.mode != "RGB":
+			image = image.convert( mode = "RGB" )
+		self.gui.comicArea.texture = Texture.create( size = image.size, colorfmt = 'rgb' )
+		self.gui.comicArea.texture.blit_buffer( pbuffer = image.transpose( Image.FLIP_TOP_BOTTOM ).tobytes(), colorfmt = 'rgb' )
@@ -0,0 +1,100 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import six
+from collections import OrderedDict
+
+from PIL import Image
+
+class ImageCache:
+	def __init__( self, maxBytes = 256 * 1000 * 1000 ):
+		'''Keeps recently used comic images decoded. Decoding a PNG takes much longer than copying the decoded pixels, and the same comic can come up many times in a batch (or every time, with --comic-id).
+			Args:
+				maxBytes: The most memory, in bytes of pixel data, to use for decoded images. When more is needed, the least recently used images are dropped. 0 turns the cache off. Defaults to 256 MB.
+		'''
+		self.maxBytes = maxBytes
+		self.images = OrderedDict() #Maps file names to decoded images, least recently used first
+		self.palettes = dict() #Maps file names to the palettes of images which were palette-based before being converted. Palettes are tiny, so they're kept even after their images are dropped.
+		self.totalBytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+	
+	def getImageBytes( self, image ):
+		'''Estimate how much memory an image's pixels take up.
+			Args:
+				image: A PIL Image.
+			Returns:
+				An integer number of bytes.
+		'''
+		if image.mode in ( "I", "F" ):
+			bytesPerBand = 4
+		else:
+			bytesPerBand = 1
+		return image.size[ 0 ] * image.size[ 1 ] * len( image.getbands() ) * bytesPerBand
+	
+	def getImage( self, fileName, copy = True ):
+		'''Get an image, decoding the file only if it isn't already cached. Images are converted from palette-based modes, since text rendering looks better that way.
+			Args:
+				fileName: The path to the image file.
+				copy: Whether to return a copy of the cached image. Callers that only read the image (e.g. to paste it into another one) can skip the copy, but then must not modify it. Defaults to True.
+			Returns:
+				A PIL Image.
+			Raises:
+				IOError if the image can't be read.
+		'''
+		image = self.images.pop( fileName, None )
+		if image is None:
+			self.misses += 1
+			image = Image.open( fileName )
+			if image.mode == "P":
+				palette = Image.new( "P", ( 1, 1 ) )
+				palette.putpalette( image.getpalette() )
+				self.palettes[ fileName ] = palette
+			image = image.convert() #Calling convert() with no mode argument converts palette-based images
+			imageBytes = self.getImageBytes( image )
+			if imageBytes > self.maxBytes: #Too big to cache at all
+				return image
+			
+			self.totalBytes += imageBytes
+			while self.totalBytes > self.maxBytes:
+				oldFileName, oldImage = self.images.popitem( last = False )
+				self.totalBytes -= self.getImageBytes( oldImage )
+				self.evictions += 1
+		else:
+			self.hits += 1
+		self.images[ fileName ] = image #(Re-)inserting the image makes it the most recently used
+		
+		if copy:
+			return image.copy()
+		return image
+	
+	def getPalette( self, fileName ):
+		'''Get the palette an image had before getImage() converted it, so that the finished comic can be saved with the same colors.
+			Args:
+				fileName: The path to the image file, as passed to getImage().
+			Returns:
+				A palette-mode PIL Image holding the palette, or None if the image wasn't palette-based or hasn't been decoded.
+		'''
+		return self.palettes.get( fileName )
+	
+	def getStats( self ):
+		'''Get the numbers showStats() shows. Worker processes each have their own cache, so this lets theirs be added up.
+			Returns:
+				A dictionary mapping names to numbers.
+		'''
+		return { "hits": self.hits, "misses": self.misses, "evictions": self.evictions, "images": len( self.images ), "totalBytes": self.totalBytes, "maxBytes": self.maxBytes }
+	
+	def showStats( self, stats = None ):
+		'''Shows how well the cache is working on standard output.
+			Args:
+				stats: A dictionary as returned by getStats(), or several of them added up. Defaults to this cache's own.
+		'''
+		if stats is None:
+			stats = self.getStats()
+		lookups = stats[ "hits" ] + stats[ "misses" ]
+		if lookups > 0:
+			hitRate = 100 * stats[ "hits" ] // lookups
+		else:
+			hitRate = 0
+		six.print_( "Image cache: " + str( stats[ "hits" ] ) + " hits, " + str( stats[ "misses" ] ) + " misses (" + str( hitRate ) + "% hit rate), " + str( stats[ "evictions" ] ) + " evictions, " + str( stats[ "images" ] ) + " images using " + "%.1f" % ( stats[ "totalBytes" ] / 1000000.0 ) + " of at most " + "%.1f" % ( stats[ "maxBytes" ] / 1000000.0 ) + " MB." )
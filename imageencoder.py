@@ -0,0 +1,101 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import six
+from timeit import default_timer
+
+#Pillow's names for these constants have moved around between versions, but the numbers haven't
+MEDIANCUT = 0
+FASTOCTREE = 2
+DITHER_NONE = 0
+
+class ImageEncoder:
+	#Each profile is ( quantizer, zlib compression level, whether to optimize ). The quantizer is None to keep full color, "mediancut" (slow, best colors), "fastoctree" (fast), "web" (the fixed 216-color web palette: fast, and compresses best, but the colors are worst), or "palette" to reuse the source image's palette when it had one (fastest, and falls back to "fastoctree" when it didn't).
+	profiles = {
+		"lossless": ( None, 6, False ),
+		"fast": ( "palette", 1, False ),
+		"balanced": ( "mediancut", 6, False ),
+		"smallest": ( "web", 9, True ), #What --saveforweb has always done
+	}
+	profileNames = ( "lossless", "fast", "balanced", "smallest" ) #In order of how much work they do, for listing them
+	
+	def __init__( self, profile = "lossless" ):
+		'''Saves finished comics as PNG files. Quantizing to 256 colors and compressing hard make files much smaller, but they're also the slowest part of making a comic, so how much of each to do is chosen by a profile.
+			Args:
+				profile: One of the names in profileNames. Defaults to "lossless", which saves full-color images at zlib's default level.
+		'''
+		if profile not in self.profiles:
+			raise ValueError( "unknown encoder profile: " + str( profile ) )
+		self.profile = profile
+		self.quantizer, self.compressLevel, self.optimize = self.profiles[ profile ]
+		self.imagesEncoded = 0
+		self.quantizeTime = 0
+		self.saveTime = 0
+	
+	def quantize( self, image, palette = None ):
+		'''Reduce an image to 256 colors or fewer, as the profile says.
+			Args:
+				image: A PIL Image.
+				palette: A palette-mode PIL Image whose palette the source image used, or None. Only used by profiles whose quantizer is "palette".
+			Returns:
+				A PIL Image, which is the same one passed in if the profile doesn't quantize.
+		'''
+		quantizer = self.quantizer
+		if quantizer is None or image.mode == "P":
+			return image
+		
+		if quantizer == "palette":
+			if palette is not None and image.mode in ( "RGB", "L" ): #Pillow can only map these modes to a given palette
+				return image.quantize( palette = palette, dither = DITHER_NONE )
+			quantizer = "fastoctree"
+		
+		if quantizer == "web":
+			return image.convert( mode = "P", dither = DITHER_NONE ) #Pillow converts to the web palette unless told otherwise
+		
+		if quantizer == "mediancut" and image.mode == "RGB":
+			method = MEDIANCUT
+		else: #Median cut doesn't support alpha channels
+			method = FASTOCTREE
+		return image.quantize( 256, method, dither = DITHER_NONE )
+	
+	def encode( self, image, outFile, pnginfo = None, palette = None ):
+		'''Quantize an image and save it as a PNG file.
+			Args:
+				image: A PIL Image.
+				outFile: A file name or a file object opened for writing in binary mode.
+				pnginfo: A PIL PngInfo holding text to embed in the file, or None.
+				palette: See quantize().
+			Returns:
+				The PIL Image that was actually saved.
+			Raises:
+				IOError or OSError if the file can't be written.
+		'''
+		startTime = default_timer()
+		image = self.quantize( image, palette )
+		saveStartTime = default_timer()
+		
+		saveOptions = { "compress_level": self.compressLevel, "optimize": self.optimize }
+		if pnginfo is not None:
+			saveOptions[ "pnginfo" ] = pnginfo
+		image.save( outFile, format="PNG", **saveOptions )
+		
+		self.quantizeTime += saveStartTime - startTime
+		self.saveTime += default_timer() - saveStartTime
+		self.imagesEncoded += 1
+		return image
+	
+	def getStats( self ):
+		'''Get the numbers showStats() shows. Worker processes each have their own encoder, so this lets theirs be added up.
+			Returns:
+				A dictionary mapping names to numbers.
+		'''
+		return { "imagesEncoded": self.imagesEncoded, "quantizeTime": self.quantizeTime, "saveTime": self.saveTime }
+	
+	def showStats( self, stats = None ):
+		'''Shows how long encoding has taken on standard output.
+			Args:
+				stats: A dictionary as returned by getStats(), or several of them added up. Defaults to this encoder's own.
+		'''
+		if stats is None:
+			stats = self.getStats()
+		six.print_( "Image encoder (" + self.profile + " profile): " + str( stats[ "imagesEncoded" ] ) + " images, " + "%.3f" % stats[ "quantizeTime" ] + " seconds quantizing, " + "%.3f" % stats[ "saveTime" ] + " seconds compressing." )
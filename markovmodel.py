@@ -0,0 +1,331 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+from __future__ import division
+from array import array
+from bisect import bisect_right
+import random
+import sys
+
+from markovnode import MarkovNode
+from weightedset import WeightedSet
+
+intSize = array( "i" ).itemsize #All the integers in saved models are this many bytes long. It's 4 on every platform Python supports.
+
+def arrayToBytes( theArray ):
+	'''Get the raw bytes of an array. Python 2 calls this tostring(), Python 3 calls it tobytes().
+		Args:
+			theArray: An array.array.
+		Returns:
+			A bytes object.
+	'''
+	if sys.version_info[ 0 ] < 3:
+		return theArray.tostring()
+	return theArray.tobytes()
+
+def bytesFromBuffer( buffer, start, end ):
+	'''Copy a range of bytes out of a buffer.
+		Args:
+			buffer: A memoryview, or (on Python 2) an mmap or string.
+			start: The offset of the first byte.
+			end: The offset just past the last byte.
+		Returns:
+			A bytes object.
+	'''
+	data = buffer[ start : end ]
+	if isinstance( data, memoryview ):
+		data = data.tobytes()
+	return data
+
+def intArrayFromBuffer( buffer, start, length ):
+	'''Get a sequence of integers stored in a buffer as machine-native 32-bit integers. On Python 3 the integers are read directly from the buffer without being copied, so if the buffer is memory-mapped, every process mapping the same file shares a single copy. Python 2 can't do that, so there the integers get copied into an array.
+		Args:
+			buffer: A memoryview of the buffer (e.g. of an mmap). On Python 2, may also be an mmap or string.
+			start: The byte offset of the first integer.
+			length: The number of integers.
+		Returns:
+			A sequence of integers which supports indexing, slicing, len(), and bisect.
+	'''
+	end = start + length * intSize
+	if sys.version_info[ 0 ] < 3:
+		result = array( "i" )
+		result.fromstring( bytesFromBuffer( buffer, start, end ) )
+		return result
+	return buffer[ start : end ].cast( "i" )
+
+
+class StringTable:
+	def __init__( self, offsets, data ):
+		'''A read-only list of strings stored end to end as UTF-8 in a single buffer, so that a memory-mapped model doesn't need a separate Python string object for every word. Strings are only decoded when asked for.
+			Args:
+				offsets: A sequence of integers. String i occupies bytes offsets[ i ] up to (but not including) offsets[ i + 1 ] of data.
+				data: A buffer holding the UTF-8 encoded strings.
+		'''
+		self.offsets = offsets
+		self.data = data
+	
+	def __len__( self ):
+		return len( self.offsets ) - 1
+	
+	def __getitem__( self, index ):
+		return bytesFromBuffer( self.data, self.offsets[ index ], self.offsets[ index + 1 ] ).decode( "utf-8" )
+
+
+class MarkovModelBuilder:
+	def __init__( self, order = 1 ):
+		'''Collects words and transitions while the transcripts are being read, then compiles them into a MarkovModel.
+			Args:
+				order: How many of the preceding words determine the next word. Defaults to 1.
+		'''
+		self.order = order
+		self.words = [] #Every distinct word, in the order first seen. A word's position in this list is its ID number.
+		self.wordIDs = dict() #Maps each word to its ID number
+		self.isEnd = array( "b" )
+		self.numTotal = array( "i" )
+		self.numBold = array( "i" )
+		self.numItalic = array( "i" )
+		self.numUnderlined = array( "i" )
+		self.sentenceStarts = WeightedSet() #IDs of words that start sentences, weighted by how often they do so
+		self.transitions = dict() #Maps each state (a tuple of the IDs of up to order preceding words in the sentence) to a WeightedSet of the IDs of the words that follow it
+		self.numInputWords = 0
+		self.numInputSentences = 0
+	
+	def addWord( self, word, isEnd = False, isBold = False, isItalic = False, isUnderlined = False ):
+		'''Record one occurrence of a word.
+			Args:
+				word: The word, with emphasis marks removed.
+				isEnd: Whether the word ends a sentence. Only the first occurrence of each word determines this.
+				isBold: Whether this occurrence is bold.
+				isItalic: Whether this occurrence is italic.
+				isUnderlined: Whether this occurrence is underlined.
+			Returns:
+				The word's ID number.
+		'''
+		wordID = self.wordIDs.get( word )
+		if wordID is None:
+			wordID = len( self.words )
+			self.wordIDs[ word ] = wordID
+			self.words.append( word )
+			self.isEnd.append( isEnd )
+			self.numTotal.append( 1 ) #Counts start at one normal occurrence so that words seen only with emphasis aren't always emphasized.
+			self.numBold.append( 0 )
+			self.numItalic.append( 0 )
+			self.numUnderlined.append( 0 )
+		
+		if isBold:
+			self.numBold[ wordID ] += 1
+			self.numTotal[ wordID ] += 1
+		if isItalic:
+			self.numItalic[ wordID ] += 1
+			self.numTotal[ wordID ] += 1
+		if isUnderlined:
+			self.numUnderlined[ wordID ] += 1
+			self.numTotal[ wordID ] += 1
+		if not isBold and not isItalic and not isUnderlined:
+			self.numTotal[ wordID ] += 1
+		
+		return wordID
+	
+	def addSentenceStart( self, wordID ):
+		'''Record that a word started a sentence.
+			Args:
+				wordID: The word's ID number.
+		'''
+		self.sentenceStarts.add( wordID )
+	
+	def addTransition( self, state, wordID ):
+		'''Record that a word followed a state.
+			Args:
+				state: A tuple of the IDs of up to order preceding words in the sentence.
+				wordID: The ID of the word that followed.
+		'''
+		if state not in self.transitions:
+			self.transitions[ state ] = WeightedSet()
+		self.transitions[ state ].add( wordID )
+	
+	def build( self ):
+		'''Compile everything recorded so far into a MarkovModel.
+			Returns:
+				A MarkovModel.
+		'''
+		#State 0 is the start of a sentence; its successors are the sentence starts. Every other state gets the next ID number.
+		states = [ ( (), self.sentenceStarts ) ] + list( self.transitions.items() )
+		stateIDs = dict()
+		for stateID in range( len( states ) ):
+			stateIDs[ states[ stateID ][ 0 ] ] = stateID
+		
+		rowOffsets = array( "i", [ 0 ] )
+		successorWords = array( "i" )
+		cumulativeCounts = array( "i" )
+		nextStates = array( "i" )
+		for state, successors in states:
+			runningTotal = 0
+			for index in range( len( successors ) ):
+				wordID = successors.items[ index ]
+				runningTotal += successors.counts[ index ]
+				successorWords.append( wordID )
+				cumulativeCounts.append( runningTotal )
+				nextStates.append( stateIDs.get( ( state + ( wordID, ) )[ -self.order: ], -1 ) )
+			rowOffsets.append( len( successorWords ) )
+		
+		model = MarkovModel()
+		model.order = self.order
+		model.words = self.words
+		model.isEnd = self.isEnd
+		model.numTotal = self.numTotal
+		model.numBold = self.numBold
+		model.numItalic = self.numItalic
+		model.numUnderlined = self.numUnderlined
+		model.rowOffsets = rowOffsets
+		model.successorWords = successorWords
+		model.cumulativeCounts = cumulativeCounts
+		model.nextStates = nextStates
+		model.numInputWords = self.numInputWords
+		model.numInputSentences = self.numInputSentences
+		return model
+
+
+class MarkovModel:
+	perWordArrayNames = [ "isEnd", "numTotal", "numBold", "numItalic", "numUnderlined" ]
+	perEdgeArrayNames = [ "successorWords", "cumulativeCounts", "nextStates" ]
+	headerLength = 7 #The number of integers at the start of a saved model. See toBytes().
+	
+	def __init__( self ):
+		'''A trained Markov graph, stored in flat arrays. Use MarkovModelBuilder to make one. Nothing in here changes after it is built, and nothing in here is specific to any one rendering of a comic; MarkovNode objects are made only for the words of generated sentences.
+			The graph is stored in compressed sparse row form: the successors of state s are at positions rowOffsets[ s ] up to (but not including) rowOffsets[ s + 1 ] in successorWords, cumulativeCounts, and nextStates. State 0 is the start of a sentence.
+		'''
+		self.order = 1
+		self.words = [] #Maps each word ID to its word
+		self.isEnd = array( "b" ) #Per word: whether the word ends a sentence
+		self.numTotal = array( "i" ) #Per word: style counts, used to randomly decide each generated word's emphasis
+		self.numBold = array( "i" )
+		self.numItalic = array( "i" )
+		self.numUnderlined = array( "i" )
+		self.rowOffsets = array( "i", [ 0, 0 ] ) #Per state: where its successors start
+		self.successorWords = array( "i" ) #Per edge: the ID of the following word
+		self.cumulativeCounts = array( "i" ) #Per edge: the running total of the counts of its state's edges up to and including this one
+		self.nextStates = array( "i" ) #Per edge: the state reached by following it, or -1 if that state has no successors
+		self.numInputWords = 0
+		self.numInputSentences = 0
+	
+	def countStates( self ):
+		'''Count the states that have at least one word following them, not including the start of a sentence.
+			Returns:
+				An integer.
+		'''
+		return len( self.rowOffsets ) - 2
+	
+	def countEdges( self ):
+		'''Count the distinct transitions from a state to a following word, not including sentence starts.
+			Returns:
+				An integer.
+		'''
+		return len( self.successorWords ) - self.rowOffsets[ 1 ]
+	
+	def chooseEdge( self, stateID, rng = None ):
+		'''Randomly select one of the edges leaving a state, weighted by how often each was seen.
+			Args:
+				stateID: The ID number of the state.
+				rng: The random.Random to make the choice with. Defaults to the random module's shared generator.
+			Returns:
+				The position of the edge in successorWords, or -1 if the state has no successors.
+		'''
+		start = self.rowOffsets[ stateID ]
+		end = self.rowOffsets[ stateID + 1 ]
+		if start == end:
+			return -1
+		
+		if rng is None:
+			rng = random
+		return bisect_right( self.cumulativeCounts, rng.random() * self.cumulativeCounts[ end - 1 ], start, end )
+	
+	def generateSentence( self, rng = None ):
+		'''Generate one sentence (a path through the Markov graph).
+			Args:
+				rng: The random.Random to choose words with. Defaults to the random module's shared generator.
+			Returns:
+				A list of word IDs. Empty if the model contains no words.
+		'''
+		result = []
+		stateID = 0
+		while stateID >= 0:
+			edge = self.chooseEdge( stateID, rng )
+			if edge < 0:
+				break
+			
+			wordID = self.successorWords[ edge ]
+			result.append( wordID )
+			if self.isEnd[ wordID ]:
+				break
+			stateID = self.nextStates[ edge ]
+		return result
+	
+	def makeNode( self, wordID, word = None, rng = None ):
+		'''Make a MarkovNode through which a generated word can be rendered.
+			Args:
+				wordID: The word's ID number.
+				word: The word as it should be displayed, e.g. with randomized capitalization. Defaults to the word itself.
+				rng: The random.Random the node will decide its style with. Defaults to the random module's shared generator.
+			Returns:
+				A MarkovNode.
+		'''
+		nonRandomizedWord = self.words[ wordID ]
+		if word is None:
+			word = nonRandomizedWord
+		
+		node = MarkovNode( word, nonRandomizedWord, bool( self.isEnd[ wordID ] ), rng = rng )
+		node.numTotal = self.numTotal[ wordID ]
+		node.numBold = self.numBold[ wordID ]
+		node.numItalic = self.numItalic[ wordID ]
+		node.numUnderlined = self.numUnderlined[ wordID ]
+		return node
+	
+	def toBytes( self ):
+		'''Convert the model into a fixed layout of native integers followed by a string table, which loadFromBuffer() can use in place (e.g. from a memory-mapped file) without converting anything.
+			The layout is: a header of headerLength integers (order, numInputWords, numInputSentences, number of words, number of row offsets, number of edges, length in bytes of the string table), then each per-word array, then rowOffsets, then each per-edge array, then the string table's offsets (one more than the number of words), then the string table itself, padded with zero bytes to a multiple of intSize.
+			Returns:
+				A bytes object.
+		'''
+		encodedWords = [ self.words[ index ].encode( "utf-8" ) for index in range( len( self.words ) ) ]
+		wordOffsets = array( "i", [ 0 ] )
+		for encodedWord in encodedWords:
+			wordOffsets.append( wordOffsets[ -1 ] + len( encodedWord ) )
+		stringData = b"".join( encodedWords )
+		stringData += b"\0" * ( -len( stringData ) % intSize )
+		
+		pieces = [ array( "i", [ self.order, self.numInputWords, self.numInputSentences, len( self.words ), len( self.rowOffsets ), len( self.successorWords ), wordOffsets[ -1 ] ] ) ]
+		for name in self.perWordArrayNames:
+			pieces.append( array( "i", getattr( self, name ) ) )
+		pieces.append( array( "i", self.rowOffsets ) )
+		for name in self.perEdgeArrayNames:
+			pieces.append( array( "i", getattr( self, name ) ) )
+		pieces.append( wordOffsets )
+		
+		return b"".join( [ arrayToBytes( piece ) for piece in pieces ] ) + stringData
+	
+	def loadFromBuffer( self, buffer, start = 0 ):
+		'''Fill the model from the output of toBytes(). On Python 3 the model keeps using the buffer itself rather than copying out of it, so the buffer must stay open for as long as the model is used.
+			Args:
+				buffer: A memoryview of the buffer containing the model, e.g. of an mmap. On Python 2, may also be an mmap or string.
+				start: The byte offset at which the model starts. Defaults to 0.
+			Returns:
+				The byte offset just past the end of the model.
+		'''
+		header = intArrayFromBuffer( buffer, start, self.headerLength )
+		self.order, self.numInputWords, self.numInputSentences, numWords, numRowOffsets, numEdges, stringDataLength = [ header[ index ] for index in range( self.headerLength ) ]
+		position = start + self.headerLength * intSize
+		
+		for name in self.perWordArrayNames:
+			setattr( self, name, intArrayFromBuffer( buffer, position, numWords ) )
+			position += numWords * intSize
+		self.rowOffsets = intArrayFromBuffer( buffer, position, numRowOffsets )
+		position += numRowOffsets * intSize
+		for name in self.perEdgeArrayNames:
+			setattr( self, name, intArrayFromBuffer( buffer, position, numEdges ) )
+			position += numEdges * intSize
+		wordOffsets = intArrayFromBuffer( buffer, position, numWords + 1 )
+		position += ( numWords + 1 ) * intSize
+		
+		self.words = StringTable( wordOffsets, buffer[ position : position + stringDataLength ] )
+		position += stringDataLength + ( -stringDataLength % intSize )
+		return position
@@ -4,9 +4,11 @@
 from __future__ import division
 import random
 
-class MarkovNode:
-	def __init__( self, word, nonRandomizedWord, isEnd = False, isBold = False, isItalic = False, isUnderlined = False, font = None ):
-		'''Initialize. Duh.
+class MarkovNode( object ):
+	__slots__ = [ "isEnd", "numTotal", "numBold", "numItalic", "numUnderlined", "boldDecided", "bold", "italicDecided", "italic", "underlinedDecided", "underlined", "word", "nonRandomizedWord", "font", "rng" ] #Nodes are made for every word of every generated sentence, so there's no need for each one to carry a __dict__
+	
+	def __init__( self, word, nonRandomizedWord, isEnd = False, isBold = False, isItalic = False, isUnderlined = False, font = None, rng = None ):
+		'''Initialize. Duh. Nodes are views of single words of a MarkovModel, holding that word's style counts along with the per-rendering state (chosen style and font).
 			Args:
 				word: The word this node represents. May or may not have randomized capitalization.
 				nonRandomizedWord: The non-randomized version of the word.
@@ -15,8 +17,8 @@ class MarkovNode:
 				isItalic: Whether this node, newly created, represents an italic word (after the node is created, this status can be affected by calling addItalic() or addNormal() )
 				isUnderlined: Whether this node, newly created, represents an underlined word (after the node is created, this status can be affected by calling addUnderlined() or addNormal() )
 				font: The PIL ImageFont associated with this node.
+				rng: The random.Random used to decide this node's style, so that the style is reproducible along with the rest of the comic. Defaults to the random module's shared generator.
 		'''
-		self.links = []
 		self.isEnd = isEnd
 		
 		self.numTotal = 0
@@ -43,6 +45,10 @@ class MarkovNode:
 		self.word = word
 		self.nonRandomizedWord = nonRandomizedWord
 		self.font = font
+		
+		if rng is None:
+			rng = random
+		self.rng = rng
 	
 	def unselectStyle( self ):
 		'''Set boldDecided, italicDecided, and underlinedDecided to False.
@@ -61,7 +67,7 @@ class MarkovNode:
 		if probability < 0 or probability > 1:
 			raise ValueError( "probability must be between 0 and 1 inclusive" )
 		
-		return( random.random() <= probability )
+		return( self.rng.random() <= probability )
 	
 	def isBold( self ):
 		'''Determine randomly whether this node should be rendered as bold text.
@@ -112,27 +118,3 @@ class MarkovNode:
 		'''
 		self.numUnderlined += 1
 		self.numTotal += 1
-
-	def getRandomLinkedNode( self ):
-		'''Randomly select one of the nodes to which this node is linked.
-		'''
-		return random.choice( self.links )
-
-	def hasLinks( self ):
-		'''Determine whether this node has any links.
-		'''
-		return len( self.links ) > 0
-
-	def addLink( self, other ):
-		'''Add to this node a link to another node.
-			Args:
-				other: The other node to which to link.
-			Returns:
-				The number of links this node has after adding the new link.
-		'''
-		self.links.append( other )
-		#if other not in self.links:
-		#	self.links[ other ] = 1
-		#else:
-		#	self.links[ other ] += 1 #If there is already a link to the other node, increase the link's value.
-		return len( self.links )
@@ -0,0 +1,158 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import six
+import sys
+import threading
+from six.moves import queue
+from timeit import default_timer
+
+class PipelineStage:
+	stopMarker = object() #Put on a stage's queue after the last item, to tell the stage there's nothing more to come
+	
+	def __init__( self, name, function, maxQueueSize = 2, nextStage = None, numberOfThreads = 1 ):
+		'''Runs a function on every item put on a queue, in a thread of its own, and passes the results on to the next stage. Stages let slow steps which don't need each other's results at the same time (like compressing one comic while uploading the one before it) overlap instead of adding up. The queue is bounded, so that a fast stage waits for a slow one instead of piling up finished comics in memory.
+			Args:
+				name: What to call the stage in its stats, e.g. "Encode".
+				function: A function taking an item and returning the item to pass to the next stage.
+				maxQueueSize: How many items can wait on the queue before put() blocks. Defaults to 2.
+				nextStage: The PipelineStage to pass results to, or None if this is the last stage.
+				numberOfThreads: How many threads run the function at once. With more than one, items may be passed on in a different order than they arrived in. Defaults to 1.
+		'''
+		self.name = name
+		self.function = function
+		self.maxQueueSize = maxQueueSize
+		self.queue = queue.Queue( maxQueueSize )
+		self.nextStage = nextStage
+		self.numberOfThreads = numberOfThreads
+		self.threads = []
+		self.threadsRunning = 0
+		self.lock = threading.Lock() #Guards the stats and threadsRunning when there's more than one thread
+		self.lastResult = None #The result for the last item queued, if this is the last stage. With more than one thread, that isn't necessarily the last to finish.
+		self.lastResultNumber = -1 #The position in the queue of the item lastResult came from
+		self.error = None #The exc_info() of the first exception the function raised, if any
+		
+		self.itemsDone = 0
+		self.busyTime = 0
+		self.startTime = None
+		self.endTime = None
+		self.itemsQueued = 0
+		self.depthTotal = 0 #The sum of the queue's depth at every put(), for the average
+		self.maxDepth = 0
+	
+	def start( self ):
+		'''Start this stage's thread, and those of all following stages.
+		'''
+		if self.nextStage is not None:
+			self.nextStage.start()
+		self.startTime = default_timer()
+		self.threadsRunning = self.numberOfThreads
+		for threadNumber in range( self.numberOfThreads ):
+			thread = threading.Thread( target = self.run, name = self.name + " " + str( threadNumber ) )
+			thread.daemon = True #So that if the main thread exits, it doesn't wait for stages stuck on a full queue
+			thread.start()
+			self.threads.append( thread )
+	
+	def put( self, item ):
+		'''Queue an item for this stage, waiting if the queue is full.
+			Args:
+				item: Anything the stage's function accepts.
+		'''
+		depth = self.queue.qsize()
+		with self.lock: #Needed when the previous stage has more than one thread
+			itemNumber = self.itemsQueued
+			self.itemsQueued += 1
+			self.depthTotal += depth
+			self.maxDepth = max( self.maxDepth, depth )
+		self.queue.put( ( itemNumber, item ) ) #Numbered so that the last stage can tell which result is the last item's
+	
+	def finish( self ):
+		'''Tell this stage that no more items are coming. It passes the message on to the following stages once it has dealt with everything already queued.
+		'''
+		for threadNumber in range( self.numberOfThreads ): #One for each thread
+			self.queue.put( self.stopMarker )
+	
+	def join( self ):
+		'''Wait for this stage and all following stages to deal with everything queued. Call finish() first.
+		'''
+		for thread in self.threads:
+			thread.join()
+		if self.nextStage is not None:
+			self.nextStage.join()
+	
+	def failed( self ):
+		'''Tells whether this stage or any following stage has failed. There's no point queuing more items once one has.
+			Returns:
+				True or False.
+		'''
+		stage = self
+		while stage is not None:
+			if stage.error is not None:
+				return True
+			stage = stage.nextStage
+		return False
+	
+	def raiseError( self ):
+		'''Re-raise the first error from this stage or any following stage, in the calling thread. Does nothing if there were no errors.
+		'''
+		stage = self
+		while stage is not None:
+			if stage.error is not None:
+				six.reraise( *stage.error )
+			stage = stage.nextStage
+	
+	def run( self ):
+		'''The stage's thread. Once the function has raised an exception, the rest of the items are taken off the queue but ignored, so that earlier stages never wait forever on a full queue.
+		'''
+		while True:
+			entry = self.queue.get()
+			if entry is self.stopMarker:
+				break
+			if self.error is not None:
+				continue
+			itemNumber, item = entry
+			
+			itemStartTime = default_timer()
+			try:
+				result = self.function( item )
+			except BaseException: #Includes SystemExit, which is how comic generation reports errors
+				self.error = sys.exc_info()
+				continue
+			with self.lock:
+				self.busyTime += default_timer() - itemStartTime
+				self.itemsDone += 1
+			
+			if self.nextStage is None:
+				with self.lock:
+					if itemNumber > self.lastResultNumber:
+						self.lastResult = result
+						self.lastResultNumber = itemNumber
+			else:
+				self.nextStage.put( result )
+		
+		with self.lock:
+			self.threadsRunning -= 1
+			lastThread = ( self.threadsRunning == 0 )
+		if lastThread:
+			self.endTime = default_timer()
+			if self.nextStage is not None:
+				self.nextStage.finish()
+	
+	def showStats( self ):
+		'''Shows how busy this stage and all following stages were on standard output.
+		'''
+		if self.itemsQueued > 0:
+			averageDepth = float( self.depthTotal ) / self.itemsQueued
+		else:
+			averageDepth = 0
+		elapsedTime = ( self.endTime or default_timer() ) - self.startTime
+		if elapsedTime > 0:
+			throughput = self.itemsDone / elapsedTime
+		else:
+			throughput = 0
+		name = self.name + " stage"
+		if self.numberOfThreads > 1:
+			name += " (" + str( self.numberOfThreads ) + " threads)"
+		six.print_( name + ": " + str( self.itemsDone ) + " items, busy " + "%.3f" % self.busyTime + " of " + "%.3f" % elapsedTime + " seconds, " + "%.2f" % throughput + " items/second, queue depth " + "%.1f" % averageDepth + " on average, " + str( self.maxDepth ) + " at most (of " + str( self.maxQueueSize ) + ")." )
+		if self.nextStage is not None:
+			self.nextStage.showStats()
@@ -2,20 +2,59 @@
 # coding=utf-8
 
 import six
+import base64
 import mimetypes
+import socket
+import sys
+import threading
+import time
 try:
 	import xmlrpc.client as client
 except ImportError as e:
 	import xmlrpclib as client
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from os import path
+from six.moves import http_client
 from sys import stderr
 try:
 	from urllib.parse import urlparse
 except ImportError as e:
-	import urlparse
+	from urlparse import urlparse
 
 
+class StreamedBinary:
+	chunkSize = 3 * 32 * 1024 #Bytes read at a time. A multiple of 3, so that the base64 of each chunk can be sent as is, with no padding in the middle.
+	
+	def __init__( self, fileObject ):
+		'''Binary data to be sent in an XML-RPC request, base64-encoded a chunk at a time as the request is sent. Unlike client.Binary, neither the data nor its much larger base64 encoding is ever held in memory all at once.
+			Args:
+				fileObject: A seekable file object opened in binary mode (or something like one, such as a BytesIO) from which to read the data.
+		'''
+		self.fileObject = fileObject
+		self.placeholder = "streamed-binary-" + str( id( self ) ) + "-" + str( time.time() ) #Stands in for the data when the rest of the request is marshalled
+	
+	def getEncodedSize( self ):
+		'''Find out how long the data will be once base64-encoded, without encoding it.
+			Returns:
+				An integer number of bytes.
+		'''
+		self.fileObject.seek( 0, 2 ) #2 means relative to the end
+		size = self.fileObject.tell()
+		return 4 * ( ( size + 2 ) // 3 )
+	
+	def send( self, connection ):
+		'''Send the base64-encoded data down an HTTP(S) connection, from the beginning, so this can be called again if a request needs retrying.
+			Args:
+				connection: An HTTPConnection whose request headers have been sent.
+		'''
+		self.fileObject.seek( 0 )
+		while True:
+			chunk = self.fileObject.read( self.chunkSize )
+			if len( chunk ) == 0:
+				break
+			connection.send( base64.b64encode( chunk ) )
+
 class Uploader:
 	def __init__( self ):
 		'''Do any initialization stuff common to all derived classes.'''
@@ -33,7 +72,11 @@ class DrupalUploader( Uploader ):
 		self.blah = 0
 
 class WordPressUploader( Uploader ):
-	def __init__( self, uri, username, password, blogID = None ):
+	transientErrorCodes = ( 408, 429, 500, 502, 503, 504 ) #HTTP status codes which mean the server might well succeed if asked again later
+	unprocessedErrorCodes = ( 408, 429, 503 ) #Transient status codes which also mean the server didn't act on the request, so any method can be retried after them. After the others, the server (or the one behind a proxy) may have done its work before failing.
+	idempotentMethods = ( "wp.getUsersBlogs", ) #Methods which do no harm if the server ends up running them twice, so they can be retried whenever they fail in a way that might be temporary
+	
+	def __init__( self, uri, username, password, blogID = None, maxConnections = 4, maxRetries = 3, retryDelay = 1.0, ledger = None ):
 		'''Connect to the server.
 			Relevant WordPress docs:
 				https://codex.WordPress.org/XML-RPC_WordPress_API/Users#wp.getUsersBlogs
@@ -41,10 +84,20 @@ class WordPressUploader( Uploader ):
 				uri: The URI to connect to with XMLRPC. This should be the xmlrpc.php file in your WordPress install directory, e.g. https://www.example.com/xmlrpc.php . SECURITY WARNING: If this URI does not use encryption (e.g. starting with httpS), then USERNAMES and PASSWORDS will be transmitted in CLEARTEXT!
 				username: The username under which these posts are made.
 				password: The password for the account.
-				blogID: The ID number of the blog to post to. Will be auto-detected if not specified.'''
+				blogID: The ID number of the blog to post to. Will be auto-detected if not specified.
+				maxConnections: The most uploads uploadMany() does at once. Each thread that uploads keeps its own connection open between uploads. Defaults to 4.
+				maxRetries: How many times to retry a request which failed in a way that might be temporary (see transientErrorCodes and callWithRetries()), or because the connection broke. Defaults to 3.
+				retryDelay: How many seconds to wait before the first retry. The wait doubles with each retry after that. Defaults to 1.0.
+				ledger: An UploadLedger in which to record uploads, so that comics which were already uploaded are skipped. Defaults to None, meaning every comic is uploaded.'''
 		
 		Uploader.__init__( self )
 		
+		self.maxConnections = maxConnections
+		self.maxRetries = maxRetries
+		self.retryDelay = retryDelay
+		self.ledger = ledger
+		self.local = threading.local() #Holds each thread's ServerProxy. A ServerProxy keeps its HTTP(S) connection alive between requests, but can't be shared between threads.
+		
 		self.uri = str( uri )
 		
 		#if not self.uri.startswith( "https://" ):
@@ -54,9 +107,8 @@ class WordPressUploader( Uploader ):
 		self.username = str( username )
 		self.password = str( password )
 		
-		self.server = client.ServerProxy( self.uri )
 		try:
-			blogInfo = self.server.wp.getUsersBlogs( self.username, self.password )
+			blogInfo = self.callWithRetries( "wp.getUsersBlogs", self.username, self.password )
 		except client.Fault as fault: #How is a fault different from an error? Beats me.
 			six.print_( "A fault occurred. Fault code %d." % fault.faultCode, file = stderr )
 			six.print_( "Fault string: %s" % fault.faultString, file = stderr )
@@ -89,9 +141,141 @@ class WordPressUploader( Uploader ):
 			if self.blogID == blog[ "blogid" ]:
 				if self.uri != blog[ "xmlrpc" ]:
 					self.uri = blog[ "xmlrpc" ]
-					self.server = client.ServerProxy( self.uri )
+					self.local = threading.local() #Forget the connection to the old URI
+	
+	def getServer( self ):
+		'''Get the calling thread's connection to the server, making one if the thread doesn't have one yet.
+			Returns:
+				An XML-RPC ServerProxy.
+		'''
+		server = getattr( self.local, "server", None )
+		if server is None:
+			server = client.ServerProxy( self.uri )
+			self.local.server = server
+		return server
+	
+	def callWithRetries( self, methodName, *args, **keywords ):
+		'''Call an XML-RPC method on the server, retrying with increasing delays if it fails in a way that might be temporary. Methods which aren't in idempotentMethods (like wp.newPost) are only retried when the server certainly didn't act on the request: it never reached the server, or the server answered with one of unprocessedErrorCodes. Otherwise a lost response would mean posting twice.
+			Args:
+				methodName: The name of the method, e.g. "wp.newPost".
+				*args: The arguments to pass to the method.
+				streamedBinary: A StreamedBinary whose placeholder is among the arguments, in place of its data. Optional; must be given as a keyword argument.
+			Returns:
+				Whatever the method returns.
+			Raises:
+				client.Fault, client.ProtocolError, client.Error, socket.error, or http_client.HTTPException if the call fails for good.
+		'''
+		streamedBinary = keywords.get( "streamedBinary" )
+		idempotent = methodName in self.idempotentMethods
+		if idempotent:
+			retryableErrorCodes = self.transientErrorCodes
+		else:
+			retryableErrorCodes = self.unprocessedErrorCodes
+		attempt = 0
+		while True:
+			try:
+				return self.sendRequest( methodName, args, streamedBinary )
+			except client.ProtocolError as error:
+				if error.errcode not in retryableErrorCodes or attempt >= self.maxRetries:
+					raise
+				reason = "Error code %d" % error.errcode
+			except ( socket.error, http_client.HTTPException ) as error:
+				if not ( idempotent or getattr( error, "requestNotSent", False ) ) or attempt >= self.maxRetries:
+					raise
+				reason = str( error ) or error.__class__.__name__
+			
+			self.local.server = None #Start over with a fresh connection
+			delay = self.retryDelay * ( 2 ** attempt )
+			six.print_( "Calling %s failed (%s). Retrying in %g seconds." % ( methodName, reason, delay ), file = stderr )
+			time.sleep( delay )
+			attempt += 1
+	
+	def sendRequest( self, methodName, args, streamedBinary = None ):
+		'''Call an XML-RPC method on the server once, over the calling thread's kept-alive connection. ServerProxy can only send requests it has already built in full, and can't say how far a failed request got, so this does the sending itself. If there's a StreamedBinary, the request is built around its placeholder and its data is sent in chunks as the request goes out.
+			Args:
+				methodName: The name of the method, e.g. "wp.uploadFile".
+				args: A tuple of the arguments to pass to the method.
+				streamedBinary: A StreamedBinary whose placeholder is among args, or None. Defaults to None.
+			Returns:
+				Whatever the method returns.
+			Raises:
+				The same as callWithRetries(). Connection errors get a requestNotSent attribute set to True when the server can't have received the request: either it was never completely sent, or the server had already closed the kept-alive connection it was sent on.
+		'''
+		request = client.dumps( args, methodName )
+		if not isinstance( request, bytes ):
+			request = request.encode( "utf-8", "xmlcharrefreplace" )
+		if streamedBinary is None:
+			head = request
+			tail = b""
+			streamedSize = 0
+		else:
+			head, tail = request.split( ( "<string>" + streamedBinary.placeholder + "</string>" ).encode( "utf-8" ) )
+			head += b"<base64>"
+			tail = b"</base64>" + tail
+			streamedSize = streamedBinary.getEncodedSize()
+		
+		parsedURI = urlparse( self.uri )
+		host = parsedURI.netloc
+		handler = parsedURI.path or "/RPC2" #The same default ServerProxy uses
+		if parsedURI.query:
+			handler += "?" + parsedURI.query
+		
+		transport = self.getServer()( "transport" )
+		sent = False
+		reusedConnection = False
+		try:
+			connection = transport.make_connection( host )
+			reusedConnection = connection.sock is not None #Otherwise the connection opens a new socket when the request is sent
+			connection.putrequest( "POST", handler )
+			connection.putheader( "Content-Type", "text/xml" )
+			connection.putheader( "User-Agent", transport.user_agent )
+			connection.putheader( "Content-Length", str( len( head ) + streamedSize + len( tail ) ) )
+			connection.endheaders()
+			connection.send( head )
+			if streamedBinary is not None:
+				streamedBinary.send( connection )
+			connection.send( tail )
+			sent = True
+			
+			response = connection.getresponse()
+			if response.status != 200:
+				response.read()
+				raise client.ProtocolError( host + handler, response.status, response.reason, dict( response.getheaders() ) )
+			transport.verbose = getattr( transport, "verbose", False ) #Normally set by the transport's own request()
+			result = transport.parse_response( response )
+		except client.Fault: #A complete response, so the connection is still good
+			raise
+		except:
+			transport.close() #The connection may be in any state, so don't reuse it
+			error = sys.exc_info()[ 1 ]
+			if not sent and isinstance( error, ( socket.error, http_client.HTTPException ) ): #A partly sent request gets ignored by the server
+				error.requestNotSent = True
+			elif reusedConnection and isinstance( error, http_client.BadStatusLine ): #No response at all on a kept-alive connection means the server had closed it (Python 3 calls this RemoteDisconnected)
+				error.requestNotSent = True
+			raise
+		
+		if len( result ) == 1:
+			result = result[ 0 ]
+		return result
 	
-	def upload( self, inputFileName = "default out.png", shortComicTitle = "", longComicTitle = None, postCategories = None, postTime = datetime.now(), postStatus = "draft", transcript = None, originalURL = None, silence = False ):
+	def uploadMany( self, jobs ):
+		'''Upload several comics at once, each as its own blog post. Up to maxConnections uploads are in progress at a time, so that waiting on the network for one doesn't hold up the others. Posts may therefore appear in a different order than the jobs are given in.
+			Args:
+				jobs: A list of dictionaries, each holding the keyword arguments for one call to upload().
+			Returns:
+				A list of what upload() returned for each job, in the same order as jobs.
+		'''
+		if len( jobs ) == 0:
+			return []
+		
+		pool = ThreadPool( min( self.maxConnections, len( jobs ) ) ) #The pool's threads, and so their connections, last for the whole batch
+		try:
+			return pool.map( lambda job: self.upload( **job ), jobs )
+		finally:
+			pool.close()
+			pool.join()
+	
+	def upload( self, inputFileName = "default out.png", shortComicTitle = "", longComicTitle = None, postCategories = None, postTime = datetime.now(), postStatus = "draft", transcript = None, originalURL = None, silence = False, inputData = None ):
 		'''Upload the comic (must be a readable image file) as a blog post.
 			Relevant WordPress docs:
 				https://codex.WordPress.org/XML-RPC_WordPress_API/Posts#wp.newPost
@@ -108,6 +292,7 @@ class WordPressUploader( Uploader ):
 				transcript: A string containing the text of the comic being uploaded. Will be read from "default out.txt" if not specified.
 				originalURL: The URL of the source comic image from which the current comic was generated. Defaults to None.
 				silence: A Boolean indicating whether to keep quiet (True) or output status messages to standard output (False)
+				inputData: The image file's contents, as bytes or a seekable file object such as a BytesIO, to upload instead of reading inputFileName from disk. inputFileName is still used to name the uploaded file and guess its MIME type. Defaults to None.
 				
 			Returns:
 				0 if everything worked, no errors.
@@ -147,22 +332,45 @@ class WordPressUploader( Uploader ):
 		else:
 			fileData[ "type" ] = fileType[ 0 ]
 			
-		fileHandle = open( inputFileName, "rb" )
-		fileData[ "bits" ] = client.Binary( fileHandle.read() )
-		fileHandle.close()
-		
 		if transcript is None:
 			transcriptFileHandle = open( "default out.txt", "rt" )
 			transcript = ""
 			for line in transcriptFileHandle:
 				transcript += line
 			transcriptFileHandle.close()
+		
+		if inputData is None:
+			fileHandle = open( inputFileName, "rb" )
+		elif isinstance( inputData, bytes ):
+			fileHandle = six.BytesIO( inputData )
+		else:
+			fileHandle = inputData
+		bits = StreamedBinary( fileHandle ) #The file is read and encoded a chunk at a time as it's sent, so big images don't take up memory several times over
+		fileData[ "bits" ] = bits.placeholder
 		try:
+			ledgerEntry = None
+			if self.ledger is not None:
+				contentHash = self.ledger.computeHash( fileHandle, transcript )
+				destination = self.uri + " " + str( self.blogID )
+				ledgerEntry = self.ledger.getEntry( contentHash, destination )
 			
-			fileUploadResult = self.server.wp.uploadFile( self.blogID, self.username, self.password, fileData )
+			if ledgerEntry is not None and ledgerEntry[ 2 ] is not None:
+				if not silence:
+					six.print_( "Already posted as post", ledgerEntry[ 2 ], "according to", self.ledger.fileName, "so not posting again." )
+				return 0
 			
-			if not silence:
-				six.print_( "File upload result:", fileUploadResult )
+			if ledgerEntry is not None and ledgerEntry[ 0 ] is not None: #The image was uploaded but the post wasn't made
+				fileUploadResult = { "id": ledgerEntry[ 0 ], "url": ledgerEntry[ 1 ] }
+				if not silence:
+					six.print_( "Already uploaded as media", ledgerEntry[ 0 ], "according to", self.ledger.fileName, "so only posting." )
+			else:
+				fileUploadResult = self.callWithRetries( "wp.uploadFile", self.blogID, self.username, self.password, fileData, streamedBinary = bits )
+				
+				if not silence:
+					six.print_( "File upload result:", fileUploadResult )
+				
+				if self.ledger is not None:
+					self.ledger.recordMedia( contentHash, destination, fileUploadResult[ "id" ], fileUploadResult[ "url" ] )
 			
 			post[ "post_content" ] = '<a href="' + fileUploadResult[ "url" ] + '"><img class="aligncenter size-full img-zoomable wp-image-' + fileUploadResult[ "id" ] + '" src="' + fileUploadResult[ "url" ] + '" alt="' + transcript + '" /></a>Click the image for full size.<p>Transcript:</p><p class="comic-transcript">' + transcript + '</p>'
 			
@@ -170,11 +378,14 @@ class WordPressUploader( Uploader ):
 				originalURL = str( originalURL )
 				post[ "post_content" ] = post[ "post_content" ] + '<p class="comic-original-url"><a href="' + originalURL + '">Original</a></p>'
 			
-			postUploadResult = self.server.wp.newPost( self.blogID, self.username, self.password, post )
+			postUploadResult = self.callWithRetries( "wp.newPost", self.blogID, self.username, self.password, post )
 			
 			if not silence:
 				six.print_( "Post upload result:", postUploadResult )
 			
+			if self.ledger is not None:
+				self.ledger.recordPost( contentHash, destination, postUploadResult )
+			
 		except client.Fault as fault:
 			six.print_( "A fault occurred. Fault code %d." % fault.faultCode, file = stderr )
 			six.print_( "Fault string: %s" % fault.faultString, file = stderr )
@@ -185,9 +396,12 @@ class WordPressUploader( Uploader ):
 			six.print_( "Error code: %d" % error.errcode, file = stderr )
 			six.print_( "Error message: %s" % error.errmsg, file = stderr )
 			return error.errcode
-		except client.Error as error:
+		except ( client.Error, socket.error, http_client.HTTPException ) as error:
 			six.print_( "An error occurred:", error, file = stderr )
 			return -1
+		finally:
+			if fileHandle is not inputData: #Leave file objects we were given open, in case the caller still needs them
+				fileHandle.close()
 		
 		
 		return 0
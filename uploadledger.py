@@ -0,0 +1,82 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+class UploadLedger:
+	def __init__( self, fileName ):
+		'''Records which comics have been uploaded where, so that re-running a batch which stopped partway (with the same --seed, so the same comics come out) doesn't post them all again. Comics are identified by a hash of their image file and transcript. The media ID is recorded as soon as the image is uploaded, so a comic whose post failed can be posted later without uploading the image again.
+			Args:
+				fileName: The path to the SQLite database to keep the ledger in. It's created if it doesn't exist.
+			Raises:
+				sqlite3.Error or OSError if the database can't be opened.
+		'''
+		directory = os.path.dirname( os.path.abspath( fileName ) )
+		if not os.path.isdir( directory ):
+			os.makedirs( directory )
+		
+		self.fileName = fileName
+		self.lock = threading.Lock() #Uploads happen on several threads at once, but an SQLite connection can only be used by one at a time
+		self.connection = sqlite3.connect( fileName, check_same_thread = False )
+		with self.lock:
+			self.connection.execute( "CREATE TABLE IF NOT EXISTS uploads ( contentHash TEXT NOT NULL, destination TEXT NOT NULL, mediaID TEXT, mediaURL TEXT, postID TEXT, PRIMARY KEY ( contentHash, destination ) )" )
+			self.connection.commit()
+	
+	def computeHash( self, fileObject, transcript ):
+		'''Compute the key that identifies a comic in the ledger.
+			Args:
+				fileObject: A seekable file object opened in binary mode, holding the comic's image file. It's read from the beginning, and left at the beginning.
+				transcript: A string containing the comic's transcript.
+			Returns:
+				A string of hexadecimal digits.
+		'''
+		contentHash = hashlib.sha256()
+		fileObject.seek( 0 )
+		while True:
+			chunk = fileObject.read( 64 * 1024 )
+			if len( chunk ) == 0:
+				break
+			contentHash.update( chunk )
+		fileObject.seek( 0 )
+		
+		if not isinstance( transcript, bytes ):
+			transcript = transcript.encode( "utf-8" )
+		contentHash.update( b"\0" + transcript )
+		return contentHash.hexdigest()
+	
+	def getEntry( self, contentHash, destination ):
+		'''Look up what has already been uploaded of a comic.
+			Args:
+				contentHash: A string as returned by computeHash().
+				destination: A string identifying the blog, e.g. its URI and blog ID.
+			Returns:
+				A tuple: ( media ID, media URL, post ID ), any of which may be None. None instead of a tuple if nothing has been uploaded.
+		'''
+		with self.lock:
+			return self.connection.execute( "SELECT mediaID, mediaURL, postID FROM uploads WHERE contentHash = ? AND destination = ?", ( contentHash, destination ) ).fetchone()
+	
+	def recordMedia( self, contentHash, destination, mediaID, mediaURL ):
+		'''Record that a comic's image has been uploaded.
+			Args:
+				contentHash: A string as returned by computeHash().
+				destination: See getEntry().
+				mediaID: The ID the blog gave the uploaded image.
+				mediaURL: The URL of the uploaded image.
+		'''
+		with self.lock:
+			self.connection.execute( "INSERT OR REPLACE INTO uploads ( contentHash, destination, mediaID, mediaURL, postID ) VALUES ( ?, ?, ?, ?, NULL )", ( contentHash, destination, str( mediaID ), str( mediaURL ) ) )
+			self.connection.commit() #Right away, so that the record survives a crash
+	
+	def recordPost( self, contentHash, destination, postID ):
+		'''Record that a comic has been posted. Call recordMedia() first.
+			Args:
+				contentHash: A string as returned by computeHash().
+				destination: See getEntry().
+				postID: The ID the blog gave the post.
+		'''
+		with self.lock:
+			self.connection.execute( "UPDATE uploads SET postID = ? WHERE contentHash = ? AND destination = ?", ( str( postID ), contentHash, destination ) )
+			self.connection.commit()
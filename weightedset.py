@@ -0,0 +1,42 @@
+#!/usr/bin/python2
+# coding=utf-8
+
+from array import array
+
+class WeightedSet:
+	def __init__( self ):
+		'''A set of items, each with a count of how many times it has been added. It holds the same information as a list containing each item once per time it was added, but it takes up space only for the distinct items.
+		'''
+		self.items = []
+		self.counts = array( "i" ) #A compact array of machine integers rather than a list of Python integer objects
+		self.indices = dict() #Maps each item to its position in self.items and self.counts
+		self.total = 0
+	
+	def __len__( self ):
+		'''Get the number of distinct items.
+		'''
+		return len( self.items )
+	
+	def __contains__( self, item ):
+		'''Determine whether an item has been added.
+		'''
+		return item in self.indices
+	
+	def add( self, item, count = 1 ):
+		'''Add an item, or increase its count if it is already in the set.
+			Args:
+				item: The item to add. Must be hashable.
+				count: How many times to add it. Defaults to 1.
+			Returns:
+				The total of all counts after adding the item.
+		'''
+		index = self.indices.get( item )
+		if index is None:
+			self.indices[ item ] = len( self.items )
+			self.items.append( item )
+			self.counts.append( count )
+		else:
+			self.counts[ index ] += count
+		
+		self.total += count
+		return self.total